@@ -2,8 +2,11 @@ import base64
 import copy
 import json
 import logging
+from array import array
 from collections import OrderedDict, Counter, deque, defaultdict
+from collections.abc import MutableMapping
 from enum import Enum, unique
+from itertools import repeat
 
 try:
     from fast_enum import FastEnum
@@ -46,6 +49,9 @@ class World(object):
         self.state = CollectionState(self)
         self._cached_entrances = None
         self._cached_locations = None
+        self._cached_player_locations = None
+        self.rule_index = None
+        self.beatable_cache = None
         self._entrance_cache = {}
         self._location_cache = {}
         self.required_locations = []
@@ -411,18 +417,30 @@ class World(object):
                 self._cached_locations.extend(region.locations)
         return self._cached_locations
 
+    def get_player_locations(self, player):
+        if self._cached_player_locations is None:
+            self._cached_player_locations = defaultdict(list)
+            for location in self.get_locations():
+                self._cached_player_locations[location.player].append(location)
+        return self._cached_player_locations[player]
+
     def clear_location_cache(self):
         self._cached_locations = None
+        self._cached_player_locations = None
 
     def clear_exp_cache(self):
         for p in range(1, self.players + 1):
             self.exp_cache[p].clear()
 
     def get_unfilled_locations(self, player=None):
-        return [location for location in self.get_locations() if (player is None or location.player == player) and location.item is None]
+        if player is not None:
+            return [location for location in self.get_player_locations(player) if location.item is None]
+        return [location for location in self.get_locations() if location.item is None]
 
     def get_filled_locations(self, player=None):
-        return [location for location in self.get_locations() if (player is None or location.player == player) and location.item is not None]
+        if player is not None:
+            return [location for location in self.get_player_locations(player) if location.item is not None]
+        return [location for location in self.get_locations() if location.item is not None]
 
     def get_reachable_locations(self, state=None, player=None):
         if state is None:
@@ -434,11 +452,21 @@ class World(object):
             state = self.state
         return [location for location in self.get_locations() if (player is None or location.player == player) and location.item is None and location.can_reach(state)]
 
+    def get_rule_index(self):
+        if self.rule_index is None:
+            self.rule_index = RuleIndex(self)
+        return self.rule_index
+
     def unlocks_new_location(self, item):
         temp_state = self.state.copy()
         temp_state.collect(item, True)
+        changed = {key for key, count in temp_state.prog_items.items() if self.state.prog_items[key] != count}
+        rule_index = self.get_rule_index()
 
         for location in self.get_unfilled_locations():
+            # already in reach of the region and the rule does not read the new item: nothing can change
+            if location.parent_region.can_reach(self.state) and not rule_index.may_change(location, changed):
+                continue
             if temp_state.can_reach(location) and not self.state.can_reach(location):
                 return True
 
@@ -450,35 +478,39 @@ class World(object):
         else:
             return all((self.has_beaten_game(state, p) for p in range(1, self.players + 1)))
 
+    def placement_key(self):
+        return (tuple(id(location.item) for location in self.get_locations()),
+                tuple(id(item) for item in self.precollected_items))
+
     def can_beat_game(self, starting_state=None, log_error=False):
         if starting_state:
-            if self.has_beaten_game(starting_state):
-                return True
-            state = starting_state.copy()
-        else:
-            state = CollectionState(self)
-
+            return self.can_beat_game_from(starting_state.copy(), log_error)
+        # from a fresh state the answer only depends on where the items are
+        placement = self.placement_key()
+        if not log_error and self.beatable_cache is not None and self.beatable_cache[0] == placement:
+            return self.beatable_cache[1]
+        beatable = self.can_beat_game_from(CollectionState(self), log_error)
+        self.beatable_cache = (placement, beatable)
+        return beatable
+
+    def can_beat_game_from(self, state, log_error=False):
         if self.has_beaten_game(state):
             return True
 
-        prog_locations = [location for location in self.get_locations() if location.item is not None and (location.item.advancement or location.event) and location not in state.locations_checked]
+        prog_locations = SphereIterator(state, [location for location in self.get_locations() if location.item is not None and (location.item.advancement or location.event) and location not in state.locations_checked])
 
         while prog_locations:
-            sphere = []
             # build up spheres of collection radius. Everything in each sphere is independent from each other in dependencies and only depends on lower spheres
-            for location in prog_locations:
-                if location.can_reach(state) and state.not_flooding_a_key(state.world, location):
-                    sphere.append(location)
+            sphere = prog_locations.next_sphere()
 
             if not sphere:
                 # ran out of places and did not finish yet, quit
                 if log_error:
-                    missing_locations = ", ".join([x.name for x in prog_locations])
+                    missing_locations = ", ".join([x.name for x in prog_locations.remaining])
                     logging.getLogger('').error(f'Cannot reach the following locations: {missing_locations}')
                 return False
 
             for location in sphere:
-                prog_locations.remove(location)
                 state.collect(location.item, True, location)
 
             if self.has_beaten_game(state):
@@ -487,25 +519,166 @@ class World(object):
         return False
 
 
+item_ids = {}
+item_names = []
+
+
+def intern_item(name):
+    # item names get a dense id on first use, shared by every world in the process
+    item_id = item_ids.get(name)
+    if item_id is None:
+        item_id = item_ids[name] = len(item_names)
+        item_names.append(name)
+    return item_id
+
+
+class ProgItems(MutableMapping):
+    # collected item counts keyed by (name, player) like a Counter, stored as one array of counts per player
+    # indexed by item id; CollectionState.has and friends read the arrays directly. The counts are unsigned, so a
+    # count taken below zero is stored as zero, which is what the Counter ended up with once the entry was deleted
+    __slots__ = ('counts',)
+
+    def __init__(self, players, counts=None):
+        self.counts = counts if counts is not None else [array('H') for _ in range(players + 1)]
+
+    def __getitem__(self, key):
+        name, player = key
+        try:
+            return self.counts[player][item_ids[name]]
+        except (KeyError, IndexError):
+            return 0
+
+    def __setitem__(self, key, value):
+        name, player = key
+        item_id = intern_item(name)
+        counts = self.counts[player]
+        if item_id >= len(counts):
+            counts.extend(repeat(0, len(item_names) - len(counts)))
+        counts[item_id] = max(0, value)
+
+    def __delitem__(self, key):
+        # like Counter, deleting a missing item is not an error
+        self[key] = 0
+
+    def __contains__(self, key):
+        return self[key] > 0
+
+    def __iter__(self):
+        for player, counts in enumerate(self.counts):
+            for item_id, count in enumerate(counts):
+                if count:
+                    yield item_names[item_id], player
+
+    def __len__(self):
+        return sum(1 for counts in self.counts for count in counts if count)
+
+    def items(self):
+        for player, counts in enumerate(self.counts):
+            for item_id, count in enumerate(counts):
+                if count:
+                    yield (item_names[item_id], player), count
+
+    def player_items(self, player):
+        for item_id, count in enumerate(self.counts[player]):
+            if count:
+                yield item_names[item_id], count
+
+    def copy(self):
+        return ProgItems(0, [counts[:] for counts in self.counts])
+
+
+class PlayerStateMap(dict):
+    # per-player containers are shared with copies of the state and only cloned when a player is first accessed.
+    # Every accessor that hands out a container goes through __getitem__; a container fetched before copy() is
+    # shared afterwards, so callers re-fetch it instead of writing through the old reference
+    def __init__(self, entries, clone):
+        super().__init__(entries)
+        self.clone = clone
+        self.shared = set()
+
+    def __getitem__(self, player):
+        value = dict.__getitem__(self, player)
+        if player in self.shared:
+            self.shared.discard(player)
+            value = self.clone(value)
+            dict.__setitem__(self, player, value)
+        return value
+
+    def __setitem__(self, player, value):
+        self.shared.discard(player)
+        dict.__setitem__(self, player, value)
+
+    def __delitem__(self, player):
+        self.shared.discard(player)
+        dict.__delitem__(self, player)
+
+    def get(self, player, default=None):
+        return self[player] if player in self else default
+
+    def setdefault(self, player, default=None):
+        if player not in self:
+            self[player] = default
+        return self[player]
+
+    def pop(self, player, *default):
+        if player not in self:
+            return dict.pop(self, player, *default)
+        value = self[player]
+        del self[player]
+        return value
+
+    def popitem(self):
+        player = next(reversed(self))
+        return player, self.pop(player)
+
+    def update(self, *args, **kwargs):
+        for player, value in dict(*args, **kwargs).items():
+            self[player] = value
+
+    def values(self):
+        return [self[player] for player in self]
+
+    def items(self):
+        return [(player, self[player]) for player in self]
+
+    def copy(self):
+        ret = PlayerStateMap(self, self.clone)
+        # both sides clone before touching a shared container, so neither sees the other's writes
+        ret.shared = set(self.keys())
+        self.shared = set(self.keys())
+        return ret
+
+
+def copy_door_counter(door_counter):
+    return door_counter[0].copy(), door_counter[1].copy()
+
+
+def copy_checklists(dungeons_to_check):
+    return defaultdict(dict, {name: checklist.copy() for name, checklist in dungeons_to_check.items()})
+
+
 class CollectionState(object):
 
     def __init__(self, parent, skip_init=False):
         self.world = parent
         if not skip_init:
-            self.prog_items = Counter()
-            self.reachable_regions = {player: dict() for player in range(1, parent.players + 1)}
-            self.blocked_connections = {player: dict() for player in range(1, parent.players + 1)}
+            self.prog_items = ProgItems(parent.players)
+            self.reachable_regions = PlayerStateMap({player: dict() for player in range(1, parent.players + 1)}, dict.copy)
+            self.blocked_connections = PlayerStateMap({player: dict() for player in range(1, parent.players + 1)}, dict.copy)
             self.events = []
             self.path = {}
             self.locations_checked = set()
+            self.checked_counts = Counter()
             self.stale = {player: True for player in range(1, parent.players + 1)}
             for item in parent.precollected_items:
                 self.collect(item, True)
             # reached vs. opened in the counter
-            self.door_counter = {player: (Counter(), Counter()) for player in range(1, parent.players + 1)}
-            self.reached_doors = {player: set() for player in range(1, parent.players + 1)}
-            self.opened_doors = {player: set() for player in range(1, parent.players + 1)}
-            self.dungeons_to_check = {player: defaultdict(dict) for player in range(1, parent.players + 1)}
+            self.door_counter = PlayerStateMap({player: (Counter(), Counter()) for player in range(1, parent.players + 1)},
+                                               copy_door_counter)
+            self.reached_doors = PlayerStateMap({player: set() for player in range(1, parent.players + 1)}, set.copy)
+            self.opened_doors = PlayerStateMap({player: set() for player in range(1, parent.players + 1)}, set.copy)
+            self.dungeons_to_check = PlayerStateMap({player: defaultdict(dict) for player in range(1, parent.players + 1)},
+                                                    copy_checklists)
         self.dungeon_limits = None
         # self.trace = None
 
@@ -620,7 +793,9 @@ class CollectionState(object):
                 or new_crystal_state == door.crystal)
 
     def check_key_doors_in_dungeons(self, rrp, player):
-        for dungeon_name, checklist in self.dungeons_to_check[player].items():
+        # containers are re-fetched after child states are copied, as copying hands self fresh ones on next access
+        for dungeon_name in list(self.dungeons_to_check[player].keys()):
+            checklist = self.dungeons_to_check[player][dungeon_name]
             if self.apply_dungeon_exploration(rrp, player, dungeon_name, checklist):
                 continue
             init_door_candidates = self.should_explore_child_state(self, dungeon_name, player)
@@ -699,6 +874,7 @@ class CollectionState(object):
                     common_doors &= {x for x in term_state.opened_doors[player] - self.opened_doors[player]
                                      if valid_d_door(x)}
 
+            checklist = self.dungeons_to_check[player][dungeon_name]
             terminal_queue = deque()
             for door in common_doors:
                 pair = self.find_door_pair(player, dungeon_name, door)
@@ -795,20 +971,17 @@ class CollectionState(object):
     def copy(self):
         ret = CollectionState(self.world, skip_init=True)
         ret.prog_items = self.prog_items.copy()
-        ret.reachable_regions = {player: copy.copy(self.reachable_regions[player]) for player in range(1, self.world.players + 1)}
-        ret.blocked_connections = {player: copy.copy(self.blocked_connections[player]) for player in range(1, self.world.players + 1)}
+        ret.reachable_regions = self.reachable_regions.copy()
+        ret.blocked_connections = self.blocked_connections.copy()
         ret.events = copy.copy(self.events)
         ret.path = copy.copy(self.path)
         ret.locations_checked = copy.copy(self.locations_checked)
+        ret.checked_counts = self.checked_counts.copy()
         ret.stale = {player: self.stale[player] for player in range(1, self.world.players + 1)}
-        ret.door_counter = {player: (copy.copy(self.door_counter[player][0]), copy.copy(self.door_counter[player][1]))
-                            for player in range(1, self.world.players + 1)}
-        ret.reached_doors = {player: copy.copy(self.reached_doors[player]) for player in range(1, self.world.players + 1)}
-        ret.opened_doors = {player: copy.copy(self.opened_doors[player]) for player in range(1, self.world.players + 1)}
-        ret.dungeons_to_check = {
-            player: defaultdict(dict, {name: copy.copy(checklist)
-                                       for name, checklist in self.dungeons_to_check[player].items()})
-            for player in range(1, self.world.players + 1)}
+        ret.door_counter = self.door_counter.copy()
+        ret.reached_doors = self.reached_doors.copy()
+        ret.opened_doors = self.opened_doors.copy()
+        ret.dungeons_to_check = self.dungeons_to_check.copy()
         return ret
 
     def apply_dungeon_exploration(self, rrp, player, dungeon_name, checklist):
@@ -865,9 +1038,9 @@ class CollectionState(object):
         # todo: universal smalls where needed
         life_count, bottle_count = 0, 0
         reduced = Counter()
-        for item, cnt in self.prog_items.items():
-            item_name, item_player = item
-            if item_player == player and self.check_if_progressive(item_name, player):
+        for item_name, cnt in self.prog_items.player_items(player):
+            item = (item_name, player)
+            if self.check_if_progressive(item_name, player):
                 if item_name.startswith('Bottle'):  # I think magic requirements can require multiple bottles
                     bottle_count += cnt
                 elif item_name in ['Boss Heart Container', 'Sanctuary Heart Container', 'Piece of Heart']:
@@ -914,15 +1087,19 @@ class CollectionState(object):
         return spot.can_reach(self)
 
     def sweep_for_events_once(self, player):
-        locations = self.world.get_filled_locations(player)
-        checked_locations = set([l for l in locations if l in self.locations_checked])
-        reachable_events = [location for location in locations if location.event and location.can_reach(self)]
+        # an event can only be reached if its region is, so only the reachable regions are rescanned; every event in
+        # them is re-tested on each pass. Access rules can extend the reachable regions, so the scan walks a snapshot
+        if self.stale[player]:
+            self.update_reachable_regions(player)
+        checked_count = self.checked_counts[player]
+        reachable_events = [location for region in list(self.reachable_regions[player]) for location in region.locations
+                            if location.event and location.item is not None and location.access_rule(self)]
         reachable_events = self._do_not_flood_the_keys(reachable_events)
         for event in reachable_events:
-            if event not in checked_locations:
+            if event not in self.locations_checked:
                 self.events.append((event.name, event.player))
                 self.collect(event.item, True, event)
-        return len(reachable_events) > len(checked_locations)
+        return len(reachable_events) > checked_count
 
     def sweep_for_events(self, key_only=False, locations=None):
         # this may need improvement
@@ -987,18 +1164,24 @@ class CollectionState(object):
         return location.parent_region.name in ['Swamp Trench 1 Alcove', 'Swamp Trench 2 Alcove']
 
     def has(self, item, player, count=1):
-        if count == 1:
-            return (item, player) in self.prog_items
-        return self.prog_items[item, player] >= count
+        try:
+            return self.prog_items.counts[player][item_ids[item]] >= count
+        except (KeyError, IndexError):
+            return count <= 0
 
     def has_sm_key(self, item, player, count=1):
         if self.world.retro[player]:
             if self.world.mode[player] == 'standard' and self.world.doorShuffle[player] == 'vanilla' and item == 'Small Key (Escape)':
                 return True  # Cannot access the shop until escape is finished.  This is safe because the key is manually placed in make_custom_item_pool
             return self.can_buy_unlimited('Small Key (Universal)', player)
-        if count == 1:
-            return (item, player) in self.prog_items
-        return self.prog_items[item, player] >= count
+        try:
+            return self.prog_items.counts[player][item_ids[item]] >= count
+        except (KeyError, IndexError):
+            return count <= 0
+
+    def reads_placement(self):
+        # access rules call this when they look at placed items rather than collected ones
+        pass
 
     def can_buy_unlimited(self, item, player):
         for shop in self.world.shops[player]:
@@ -1007,7 +1190,10 @@ class CollectionState(object):
         return False
 
     def item_count(self, item, player):
-        return self.prog_items[item, player]
+        try:
+            return self.prog_items.counts[player][item_ids[item]]
+        except (KeyError, IndexError):
+            return 0
 
     def has_crystals(self, count, player):
         crystals = ['Crystal 1', 'Crystal 2', 'Crystal 3', 'Crystal 4', 'Crystal 5', 'Crystal 6', 'Crystal 7']
@@ -1020,7 +1206,7 @@ class CollectionState(object):
         return self.bottle_count(player) > 0
 
     def bottle_count(self, player):
-        return len([item for (item, itemplayer) in self.prog_items if item.startswith('Bottle') and itemplayer == player])
+        return len([item for item, count in self.prog_items.player_items(player) if item.startswith('Bottle')])
 
     def has_hearts(self, player, count):
         # Warning: This only considers items that are marked as advancement items
@@ -1184,6 +1370,8 @@ class CollectionState(object):
 
     def collect(self, item, event=False, location=None):
         if location:
+            if location not in self.locations_checked and location.item is not None:
+                self.checked_counts[location.player] += 1
             self.locations_checked.add(location)
         if not item:
             return
@@ -1320,6 +1508,147 @@ class CollectionState(object):
 
         raise RuntimeError('Cannot parse %s.' % item)
 
+
+class RuleProbe(CollectionState):
+    # evaluates an access rule against assumed item counts, recording which items it reads
+    # anything else a rule looks at (regions, doors, placements) leaves the probe volatile
+    def __init__(self, world, assumed):
+        super().__init__(world, skip_init=True)
+        self.assumed = assumed
+        self.reads = []
+        self.volatile = False
+
+    def has(self, item, player, count=1):
+        self.reads.append(((item, player), count))
+        return self.assumed.get((item, player), 0) >= count
+
+    def has_sm_key(self, item, player, count=1):
+        if self.world.retro[player]:
+            return super().has_sm_key(item, player, count)
+        return self.has(item, player, count)
+
+    def item_count(self, item, player):
+        current = self.assumed.get((item, player), 0)
+        self.reads.append(((item, player), current + 1))
+        return current
+
+    def reads_placement(self):
+        self.volatile = True
+
+
+class RuleIndex(object):
+    # reverse index from (item, player) to the entrances and locations whose access rules read that item
+    probe_limit = 256
+
+    def __init__(self, world):
+        self.world = world
+        self.dependents = defaultdict(list)
+        self.volatile = []
+        self.probed = {}
+        for region in world.regions:
+            for spot in region.exits + region.locations:
+                self.add(spot)
+
+    def add(self, spot):
+        reads = self.probe(spot.access_rule)
+        self.probed[spot] = (spot.access_rule, reads)
+        if reads is None:
+            self.volatile.append(spot)
+        else:
+            for key in reads:
+                self.dependents[key].append(spot)
+
+    def probe(self, rule):
+        # walk every path through the rule by raising the count of each item it reads to the amount it asked for
+        reads, pending, seen = set(), [{}], set()
+        while pending:
+            assumed = pending.pop()
+            signature = frozenset(assumed.items())
+            if signature in seen:
+                continue
+            seen.add(signature)
+            if len(seen) > self.probe_limit:
+                return None
+            probe = RuleProbe(self.world, assumed)
+            try:
+                rule(probe)
+            except Exception:
+                return None
+            if probe.volatile:
+                return None
+            for key, count in probe.reads:
+                reads.add(key)
+                if assumed.get(key, 0) < count:
+                    pending.append({**assumed, key: count})
+        return frozenset(reads)
+
+    def may_change(self, spot, changed_items):
+        if spot not in self.probed:
+            return True
+        rule, reads = self.probed[spot]
+        if rule is not spot.access_rule or reads is None:
+            return True
+        return not reads.isdisjoint(changed_items)
+
+    def to_json(self):
+        def spot_name(spot):
+            return f'{spot.name} ({spot.player})'
+        return {
+            'dependents': {f'{item} ({player})': [spot_name(x) for x in spots]
+                           for (item, player), spots in sorted(self.dependents.items())},
+            'volatile': [spot_name(x) for x in self.volatile]
+        }
+
+    def dump(self, path):
+        with open(path, 'w') as outfile:
+            json.dump(self.to_json(), outfile, indent=4)
+
+
+class SphereIterator(object):
+    # builds collection spheres over a state that only gains items: a candidate that failed its last check is
+    # skipped until its region becomes reachable or an item its access rule reads changes count
+    def __init__(self, state, locations):
+        self.state = state
+        self.rule_index = state.world.get_rule_index()
+        self.remaining = dict.fromkeys(locations)
+        self.waiting = {}
+        self.counts = state.prog_items.copy()
+
+    def __bool__(self):
+        return bool(self.remaining)
+
+    def discard(self, location):
+        self.remaining.pop(location, None)
+        self.waiting.pop(location, None)
+
+    def changed_items(self):
+        counts, last = self.state.prog_items, self.counts
+        changed = {key for key, count in counts.items() if last[key] != count}
+        changed.update(key for key in last if key not in counts)
+        self.counts = counts.copy()
+        return changed
+
+    def next_sphere(self):
+        state, rule_index = self.state, self.rule_index
+        changed = self.changed_items()
+        sphere = []
+        for location in self.remaining:
+            region_reached = self.waiting.get(location)
+            if region_reached and not rule_index.may_change(location, changed):
+                continue
+            if not location.parent_region.can_reach(state):
+                self.waiting[location] = False
+            elif not location.access_rule(state):
+                self.waiting[location] = True
+            else:
+                # flooding depends on what has been checked so far, so it is always re-evaluated
+                self.waiting.pop(location, None)
+                if state.not_flooding_a_key(state.world, location):
+                    sphere.append(location)
+        for location in sphere:
+            del self.remaining[location]
+        return sphere
+
 @unique
 class RegionType(Enum):
     Menu = 0
@@ -2124,6 +2453,7 @@ class Location(object):
         self.access_rule = lambda state: True
         self.item_rule = lambda item: True
         self.player = player
+        self.hash = hash((name, player))
         self.skip = False
         self.type = LocationType.Normal if not crystal else LocationType.Prize
         self.pot = None
@@ -2170,7 +2500,7 @@ class Location(object):
         return self.name == other.name and self.player == other.player
 
     def __hash__(self):
-        return hash((self.name, self.player))
+        return self.hash
 
 
 class LocationType(FastEnum):
@@ -2188,6 +2518,7 @@ class Item(object):
                  pedestal_credit=None, sickkid_credit=None, zora_credit=None, witch_credit=None, fluteboy_credit=None,
                  hint_text=None, player=None):
         self.name = name
+        intern_item(name)  # collected counts are indexed by item id, see ProgItems
         self.advancement = advancement
         self.priority = priority
         self.type = type
@@ -71,6 +71,9 @@ def parse_cli(argv, no_defaults=False):
 
     parser.add_argument('--seed', default=defval(int(settings["seed"]) if settings["seed"] != "" and settings["seed"] is not None else None), help="\n".join(fish.translate("cli", "help", "seed")), type=int)
     parser.add_argument('--count', default=defval(int(settings["count"]) if settings["count"] != "" and settings["count"] is not None else 1), help="\n".join(fish.translate("cli", "help", "count")), type=int)
+    parser.add_argument('--workers', default=defval(int(settings["workers"])), help="\n".join(fish.translate("cli", "help", "workers")), type=int)
+    parser.add_argument('--rom_workers', default=defval(int(settings["rom_workers"])), help="\n".join(fish.translate("cli", "help", "rom_workers")), type=int)
+    parser.add_argument('--fill_retries', default=defval(int(settings["fill_retries"])), help="\n".join(fish.translate("cli", "help", "fill_retries")), type=int)
     parser.add_argument('--customitemarray', default={}, help=argparse.SUPPRESS)
 
     # included for backwards compatibility
@@ -215,6 +218,8 @@ def parse_settings():
         "calc_playthrough": True,
         "create_rom": True,
         "bps": False,
+        "bps_encoder": "indexed",
+        "profile": False,
         "usestartinventory": False,
         "custom": False,
         "rom": os.path.join(".", "Zelda no Densetsu - Kamigami no Triforce (Japan).sfc"),
@@ -222,6 +227,9 @@ def parse_settings():
 
         "seed": "",
         "count": 1,
+        "workers": 1,
+        "rom_workers": 1,
+        "fill_retries": 0,
         "startinventory": "",
         "beemizer": 0,
         "remote_items": False,
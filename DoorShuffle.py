@@ -14,10 +14,14 @@ from Items import ItemFactory
 from RoomData import DoorKind, PairedDoor, reset_rooms
 from DungeonGenerator import ExplorationState, convert_regions, generate_dungeon, pre_validate, determine_required_paths, drop_entrances
 from DungeonGenerator import create_dungeon_builders, split_dungeon_builder, simple_dungeon_builder, default_dungeon_entrances
-from DungeonGenerator import dungeon_portals, dungeon_drops, GenerationException
+from DungeonGenerator import dungeon_portals, dungeon_drops, GenerationException, ProposalTimeoutException
 from DungeonGenerator import valid_region_to_explore as valid_region_to_explore_lim
-from KeyDoorShuffle import analyze_dungeon, build_key_layout, validate_key_layout, determine_prize_lock
-from Utils import ncr, kth_combination
+from KeyDoorShuffle import analyze_dungeon, build_key_layout, validate_key_layout, determine_prize_lock, KeyLayoutSearch
+from Utils import ncr, kth_combination, random_permutation
+
+
+# layout searches allowed per builder before the player's door linking starts over
+builder_attempts = 3
 
 
 def link_doors(world, player):
@@ -792,7 +796,7 @@ def main_dungeon_generation(dungeon_builders, recombinant_builders, connections_
             last_key = builder.name
             loops += 1
         else:
-            ds = generate_dungeon(builder, origin_list, split_dungeon, world, player)
+            ds = generate_builder(builder, origin_list, split_dungeon, world, player)
             find_new_entrances(ds, entrances_map, connections, potentials, enabled_entrances, world, player)
             ds.name = name
             builder.master_sector = ds
@@ -805,6 +809,20 @@ def main_dungeon_generation(dungeon_builders, recombinant_builders, connections_
     world.dungeon_layouts[player] = dungeon_builders
 
 
+def generate_builder(builder, origin_list, split_dungeon, world, player):
+    # a layout search that timed out has not connected any doors yet, so only this builder needs another try
+    # the search keeps what it learned on the builder, a proven impossible layout still resets the whole player
+    attempt = 1
+    while True:
+        try:
+            return generate_dungeon(builder, origin_list, split_dungeon, world, player)
+        except ProposalTimeoutException as e:
+            if attempt >= builder_attempts:
+                raise
+            attempt += 1
+            logging.getLogger('').debug(f'{str(e)} Retrying {builder.name}, attempt {attempt}')
+
+
 def determine_entrance_list_vanilla(world, player):
     entrance_map = {}
     potential_entrances = {}
@@ -1487,9 +1505,8 @@ def find_valid_combination(builder, start_regions, world, player, drop_keys=True
     combinations = ncr(len(builder.candidates), builder.key_doors_num)
     itr = 0
     start = time.process_time()
-    sample_list = list(range(0, int(combinations)))
-    random.shuffle(sample_list)
-    proposal = kth_combination(sample_list[itr], builder.candidates, builder.key_doors_num)
+    samples = random_permutation(int(combinations))
+    proposal = kth_combination(next(samples), builder.candidates, builder.key_doors_num)
 
     # eliminate start region if portal marked as destination
     excluded = {}
@@ -1501,7 +1518,8 @@ def find_valid_combination(builder, start_regions, world, player, drop_keys=True
 
     key_layout = build_key_layout(builder, start_regions, proposal, world, player)
     determine_prize_lock(key_layout, world, player)
-    while not validate_key_layout(key_layout, world, player):
+    search = KeyLayoutSearch()
+    while not search.validate(key_layout, world, player):
         itr += 1
         stop_early = False
         if itr % 1000 == 0:
@@ -1517,15 +1535,16 @@ def find_valid_combination(builder, start_regions, world, player, drop_keys=True
             if builder.key_doors_num < 0:
                 raise Exception('Bad dungeon %s - 0 key doors not valid' % builder.name)
             combinations = ncr(len(builder.candidates), builder.key_doors_num)
-            sample_list = list(range(0, int(combinations)))
-            random.shuffle(sample_list)
+            samples = random_permutation(int(combinations))
+            search.clear()
             itr = 0
             start = time.process_time()  # reset time since itr reset
-        proposal = kth_combination(sample_list[itr], builder.candidates, builder.key_doors_num)
+        proposal = kth_combination(next(samples), builder.candidates, builder.key_doors_num)
         key_layout.reset(proposal, builder, world, player)
         if (itr+1) % 1000 == 0:
             mark = time.process_time()-start
             logger.info('%s time elapsed. %s iterations/s', mark, itr/mark)
+    logger.debug('%s: %s key door layouts validated, %s pruned', builder.name, search.validated, search.pruned)
     # make changes
     if player not in world.key_logic.keys():
         world.key_logic[player] = {}
@@ -77,6 +77,13 @@ def generate_dungeon(builder, entrance_region_names, split_dungeon, world, playe
     return master_sector
 
 
+# restart schedule for generate_dungeon_find_proposal: the first attempt is cut off after restart_cutoff choices and
+# each following one is given restart_growth times as many, until proposal_iteration_budget choices have been made
+restart_cutoff = 100
+restart_growth = 1.5
+proposal_iteration_budget = 10000
+
+
 def generate_dungeon_find_proposal(builder, entrance_region_names, split_dungeon, world, player):
     logger = logging.getLogger('')
     name = builder.name
@@ -120,17 +127,22 @@ def generate_dungeon_find_proposal(builder, entrance_region_names, split_dungeon
     depth = 0
     dungeon_cache = {}
     backtrack = False
-    itr = 0
+    itr, total_itr = 0, 0
     attempt = 1
+    cutoff = restart_cutoff
     finished = False
+    # partial proposals that cannot be completed, kept across attempts
+    nogoods = builder.nogoods.setdefault(frozenset(x.name for x in entrance_regions), set())
     # flag if standard and this is hyrule castle
     paths = determine_paths_for_dungeon(world, player, all_regions, name)
     while not finished:
         # what are my choices?
         itr += 1
-        if itr > 1000:
-            if attempt > 9:
-                raise GenerationException('Generation taking too long. Ref %s' % name)
+        total_itr += 1
+        builder.proposal_itr += 1
+        if itr > cutoff:
+            if total_itr > proposal_iteration_budget:
+                raise ProposalTimeoutException('Generation taking too long. Ref %s' % name)
             proposed_map = {}
             choices_master = [[]]
             depth = 0
@@ -138,13 +150,21 @@ def generate_dungeon_find_proposal(builder, entrance_region_names, split_dungeon
             backtrack = False
             itr = 0
             attempt += 1
+            cutoff = int(cutoff * restart_growth)
+            builder.proposal_restarts += 1
             logger.debug(f'Starting new attempt {attempt}')
         if depth not in dungeon_cache.keys():
-            dungeon, hangers, hooks = gen_dungeon_info(name, builder.sectors, entrance_regions, all_regions, proposed_map,
-                                                       doors_to_connect, bk_needed, bk_special, world, player)
-            dungeon_cache[depth] = dungeon, hangers, hooks
-            valid = check_valid(name, dungeon, hangers, hooks, proposed_map, doors_to_connect, all_regions,
-                                bk_needed, bk_special, paths, entrance_regions, world, player)
+            if frozenset(proposed_map.items()) in nogoods:
+                valid = False
+            else:
+                dungeon, hangers, hooks = gen_dungeon_info(name, builder.sectors, entrance_regions, all_regions,
+                                                           proposed_map, doors_to_connect, bk_needed, bk_special,
+                                                           world, player)
+                dungeon_cache[depth] = dungeon, hangers, hooks
+                valid = check_valid(name, dungeon, hangers, hooks, proposed_map, doors_to_connect, all_regions,
+                                    bk_needed, bk_special, paths, entrance_regions, world, player)
+                if not valid:
+                    nogoods.add(frozenset(proposed_map.items()))
         else:
             dungeon, hangers, hooks = dungeon_cache[depth]
             valid = True
@@ -163,6 +183,8 @@ def generate_dungeon_find_proposal(builder, entrance_region_names, split_dungeon
             # make a choice
             hanger, hook = make_a_choice(dungeon, hangers, hooks, prev_choices, name)
             if hanger is None:
+                # every way to link this hanger failed, so this proposal cannot be completed either
+                nogoods.add(frozenset(proposed_map.items()))
                 backtrack = True
             else:
                 logger.debug(' ' * depth + "%d: Linking %s to %s", depth, hanger.name, hook.name)
@@ -1185,6 +1207,10 @@ class DungeonBuilder(object):
         self.path_entrances = None  # used for pathing/key doors, I think
         self.split_flag = False
 
+        self.nogoods = {}  # entrance regions -> partial proposals that cannot be completed
+        self.proposal_itr = 0
+        self.proposal_restarts = 0
+
         self.candidates = None
         self.total_keys = None
         self.key_doors_num = None
@@ -3143,6 +3169,11 @@ class GenerationException(Exception):
     pass
 
 
+class ProposalTimeoutException(GenerationException):
+    # the layout search gave up without proving the builder's sectors can't be connected
+    pass
+
+
 class DoorEquation:
 
     def __init__(self, door):
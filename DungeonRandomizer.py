@@ -5,8 +5,10 @@ if __name__ == '__main__':
 
 import os
 import logging
+import multiprocessing
 import RaceRandom as random
 import sys
+import time
 
 from source.classes.BabelFish import BabelFish
 import source.classes.diags as diagnostics
@@ -17,6 +19,46 @@ from Rom import get_sprite_from_name
 from Utils import is_bundled, close_console
 from Fill import FillError
 
+worker_fish = None
+
+
+def init_worker(loglevel, lang):
+    # runs once per pool process, so imports and translations are loaded a single time per worker
+    global worker_fish
+    logging.basicConfig(format='%(message)s', level=loglevel)
+    worker_fish = BabelFish(lang=lang)
+
+
+def generate_seed(job):
+    args, seed = job
+    start_time = time.perf_counter()
+    try:
+        main(seed=seed, args=args, fish=worker_fish)
+        error = None
+    except (FillError, EnemizerError, Exception, RuntimeError) as err:
+        error = str(err)
+    return seed, time.perf_counter() - start_time, error
+
+
+def generate_parallel(args, fish, loglevel, lang):
+    # seeds are drawn up front so the same --seed always produces the same list, regardless of worker count
+    random.seed(None)
+    seed = args.seed or random.randint(0, 999999999)
+    random.seed(seed)
+    seeds = [seed] + [random.randint(0, 999999999) for _ in range(args.count - 1)]
+    failures = []
+    logger = logging.getLogger('')
+    with multiprocessing.Pool(args.workers, initializer=init_worker, initargs=(loglevel, lang)) as pool:
+        for run, (seed, elapsed, error) in enumerate(pool.imap(generate_seed, [(args, s) for s in seeds])):
+            if error is None:
+                logger.info('%s %s', fish.translate("cli","cli","finished.run"), run+1)
+            else:
+                failures.append((error, seed))
+                logger.warning('%s: %s', fish.translate("cli","cli","generation.failed"), error)
+            logger.info('%s\t' + fish.translate("cli","cli","total.time"), seed, elapsed)
+    return failures
+
+
 def start():
     args = parse_cli(None)
 
@@ -62,18 +104,21 @@ def start():
         from Gui import guiMain
         guiMain(args)
     elif args.count is not None and args.count > 1:
-        random.seed(None)
-        seed = args.seed or random.randint(0, 999999999)
-        failures = []
         logger = logging.getLogger('')
-        for _ in range(args.count):
-            try:
-                main(seed=seed, args=args, fish=fish)
-                logger.info('%s %s', fish.translate("cli","cli","finished.run"), _+1)
-            except (FillError, EnemizerError, Exception, RuntimeError) as err:
-                failures.append((err, seed))
-                logger.warning('%s: %s', fish.translate("cli","cli","generation.failed"), err)
-            seed = random.randint(0, 999999999)
+        if args.workers is not None and args.workers > 1:
+            failures = generate_parallel(args, fish, loglevel, lang)
+        else:
+            random.seed(None)
+            seed = args.seed or random.randint(0, 999999999)
+            failures = []
+            for _ in range(args.count):
+                try:
+                    main(seed=seed, args=args, fish=fish)
+                    logger.info('%s %s', fish.translate("cli","cli","finished.run"), _+1)
+                except (FillError, EnemizerError, Exception, RuntimeError) as err:
+                    failures.append((err, seed))
+                    logger.warning('%s: %s', fish.translate("cli","cli","generation.failed"), err)
+                seed = random.randint(0, 999999999)
         for fail in failures:
             logger.info('%s\tseed failed with: %s', fail[1], fail[0])
         fail_rate = 100 * len(failures) / args.count
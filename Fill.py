@@ -5,7 +5,7 @@ import logging
 import math
 from contextlib import suppress
 
-from BaseClasses import CollectionState, FillError, LocationType
+from BaseClasses import CollectionState, FillError, LocationType, SphereIterator
 from Items import ItemFactory
 from Regions import shop_to_location_table, retro_shops
 from source.item.FillUtil import filter_locations, classify_major_items, replace_trash_item, vanilla_fallback
@@ -635,6 +635,7 @@ def balance_multiworld_progression(world):
     state = CollectionState(world)
     checked_locations = set()
     unchecked_locations = set(world.get_locations())
+    spheres = SphereIterator(state, unchecked_locations)
 
     reachable_locations_count = {}
     for player in range(1, world.players + 1):
@@ -645,7 +646,8 @@ def balance_multiworld_progression(world):
         return {loc for loc in locations if sphere_state.can_reach(loc) and sphere_state.not_flooding_a_key(sphere_state.world, loc)}
 
     while True:
-        sphere_locations = get_sphere_locations(state, unchecked_locations)
+        state.sweep_for_events(key_only=True, locations=unchecked_locations)
+        sphere_locations = set(spheres.next_sphere())
         for location in sphere_locations:
             unchecked_locations.remove(location)
             reachable_locations_count[location.player] += 1
@@ -733,6 +735,7 @@ def balance_multiworld_progression(world):
                     unlocked = {fresh for player in balancing_players for fresh in unlocked_locations[player]}
                     for location in get_sphere_locations(state, unlocked):
                         unchecked_locations.remove(location)
+                        spheres.discard(location)
                         reachable_locations_count[location.player] += 1
                         sphere_locations.add(location)
 
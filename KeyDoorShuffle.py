@@ -1402,6 +1402,57 @@ def prize_relevance(key_layout, dungeon_entrance):
 
 
 # Soft lock stuff
+class ProposalProbe(list):
+    # a flattened proposal that records every door it was asked about
+    def __init__(self, flat_proposal):
+        super().__init__(flat_proposal)
+        self.members = set(flat_proposal)
+        self.queried = set()
+
+    def __contains__(self, door):
+        self.queried.add(door)
+        return door in self.members
+
+
+class KeyLayoutSearch(object):
+    # Validation only sees a proposal through membership tests, so a failure is explained by the doors that were asked
+    # about: the ones that were key doors and the ones that were not. Any later proposal giving the same answers for
+    # those doors fails the same way and is skipped without exploring it.
+    def __init__(self):
+        self.nogoods = defaultdict(list)
+        self.validated = 0
+        self.pruned = 0
+
+    def clear(self):
+        # a different number of key doors changes the key locations available, so earlier failures may not hold
+        self.nogoods.clear()
+
+    def known_invalid(self, flat_proposal):
+        doors = set(flat_proposal)
+        # nogoods are filed under one of their key doors, or None if they have none
+        for door in itertools.chain([None], doors):
+            for required, forbidden in self.nogoods.get(door, []):
+                if required <= doors and doors.isdisjoint(forbidden):
+                    return True
+        return False
+
+    def validate(self, key_layout, world, player):
+        flat_proposal = key_layout.flat_prop
+        if self.known_invalid(flat_proposal):
+            self.pruned += 1
+            return False
+        self.validated += 1
+        probe = key_layout.flat_prop = ProposalProbe(flat_proposal)
+        try:
+            valid = validate_key_layout(key_layout, world, player)
+        finally:
+            key_layout.flat_prop = flat_proposal
+        if not valid:
+            required = frozenset(probe.queried & probe.members)
+            self.nogoods[next(iter(required), None)].append((required, frozenset(probe.queried - probe.members)))
+        return valid
+
+
 def validate_key_layout(key_layout, world, player):
     # retro is all good - except for hyrule castle in standard mode
     if (world.retro[player] and (world.mode[player] != 'standard' or key_layout.sector.name != 'Hyrule Castle')) or world.logic[player] == 'nologic':
@@ -2,13 +2,14 @@ import copy
 from itertools import zip_longest
 import json
 import logging
+import multiprocessing
 import os
 import RaceRandom as random
 import string
 import time
 import zlib
 
-from BaseClasses import World, CollectionState, Item, Region, Location, Shop, Entrance, Settings
+from BaseClasses import World, CollectionState, SphereIterator, Item, Region, Location, Shop, Entrance, Settings
 from Bosses import place_bosses
 from Items import ItemFactory
 from KeyDoorShuffle import validate_key_placement
@@ -17,21 +18,22 @@ from PotShuffle import shuffle_pots, shuffle_pot_switches
 from Regions import create_regions, create_shops, mark_light_world_regions, create_dungeon_regions, adjust_locations
 from InvertedRegions import create_inverted_regions, mark_dark_world_regions
 from EntranceShuffle import link_entrances, link_inverted_entrances
-from Rom import patch_rom, patch_race_rom, patch_enemizer, apply_rom_settings, LocalRom, JsonRom, get_hash_string
+from Rom import patch_rom_shared, patch_rom_team, distinguish_progressive_bow, patch_race_rom, patch_enemizer, apply_rom_settings, LocalRom, JsonRom, get_hash_string
 from Doors import create_doors
 from DoorShuffle import link_doors, connect_portal, link_doors_prep
 from RoomData import create_rooms
 from Rules import set_rules
 from Dungeons import create_dungeons
-from Fill import distribute_items_restrictive, promote_dungeon_items, fill_dungeons_restrictive, ensure_good_pots
+from Fill import distribute_items_restrictive, promote_dungeon_items, fill_dungeons_restrictive, ensure_good_pots, FillError
 from Fill import sell_potions, sell_keys, balance_multiworld_progression, balance_money_progression, lock_shop_locations
 from ItemList import generate_itempool, difficulties, fill_prizes, customize_shops
 from Utils import output_path, parse_player_names
 
 from source.item.FillUtil import create_item_pool_config, massage_item_pool, district_item_pool_config
-from source.tools.BPS import create_bps_from_data
+from source.tools.BPS import create_bps_from_data, bps_encoders
+from source.tools.Profiler import Profiler
 
-__version__ = '1.1.8-dev'
+__version__ = '1.1.9-dev'
 
 from source.classes.BabelFish import BabelFish
 
@@ -48,12 +50,22 @@ def check_python_version():
 
 
 def main(args, seed=None, fish=None):
+    profiler = Profiler(args.profile)
+    try:
+        return generate(args, seed, fish, profiler)
+    finally:
+        # the counters are installed on CollectionState itself, so they must not outlive a run that raised
+        profiler.finish()
+
+
+def generate(args, seed, fish, profiler):
     check_python_version()
     if args.outputpath:
         os.makedirs(args.outputpath, exist_ok=True)
         output_path.cached_path = args.outputpath
 
     start = time.perf_counter()
+    profiler.stage('create_world')
 
     if args.securerandom:
         random.use_secure()
@@ -151,6 +163,7 @@ def main(args, seed=None, fish=None):
     if args.mystery and not args.suppress_meta:
         world.spoiler.mystery_meta_to_file(output_path(f'{outfilebase}_meta.txt'))
 
+    profiler.stage('create_regions')
     for player in range(1, world.players + 1):
         if world.mode[player] != 'inverted':
             create_regions(world, player)
@@ -176,6 +189,7 @@ def main(args, seed=None, fish=None):
                     shuffle_pot_switches(world, player)
 
     logger.info(world.fish.translate("cli","cli","shuffling.world"))
+    profiler.stage('link_entrances')
 
     for player in range(1, world.players + 1):
         if world.mode[player] != 'inverted':
@@ -184,12 +198,14 @@ def main(args, seed=None, fish=None):
             link_inverted_entrances(world, player)
 
     logger.info(world.fish.translate("cli", "cli", "shuffling.prep"))
+    profiler.stage('link_doors_prep')
     for player in range(1, world.players + 1):
         link_doors_prep(world, player)
 
     create_item_pool_config(world)
 
     logger.info(world.fish.translate("cli", "cli", "shuffling.dungeons"))
+    profiler.stage('link_doors')
 
     for player in range(1, world.players + 1):
         link_doors(world, player)
@@ -198,15 +214,18 @@ def main(args, seed=None, fish=None):
         else:
             mark_dark_world_regions(world, player)
     logger.info(world.fish.translate("cli", "cli", "generating.itempool"))
+    profiler.stage('generate_itempool')
 
     for player in range(1, world.players + 1):
         generate_itempool(world, player)
 
     logger.info(world.fish.translate("cli","cli","calc.access.rules"))
+    profiler.stage('set_rules')
 
     for player in range(1, world.players + 1):
         set_rules(world, player)
 
+    profiler.stage('prepare_item_pool')
     district_item_pool_config(world)
     for player in range(1, world.players + 1):
         if world.shopsanity[player]:
@@ -217,115 +236,99 @@ def main(args, seed=None, fish=None):
             lock_shop_locations(world, player)
 
     massage_item_pool(world)
-    logger.info(world.fish.translate("cli", "cli", "placing.dungeon.prizes"))
 
-    fill_prizes(world)
+    # the world is fully shuffled and the pool prepared: a failed fill only needs this stage redone
+    fill_checkpoint = checkpoint_fill_stage(world)
+    world.fill_retries = 0
+    while True:
+        try:
+            logger.info(world.fish.translate("cli", "cli", "placing.dungeon.prizes"))
+            profiler.stage('fill_prizes')
 
-    # used for debugging
-    # fill_specific_items(world)
+            fill_prizes(world)
 
-    logger.info(world.fish.translate("cli","cli","placing.dungeon.items"))
+            # used for debugging
+            # fill_specific_items(world)
 
-    if args.algorithm != 'equitable':
-        shuffled_locations = world.get_unfilled_locations()
-        random.shuffle(shuffled_locations)
-        fill_dungeons_restrictive(world, shuffled_locations)
-    else:
-        promote_dungeon_items(world)
-
-    for player in range(1, world.players+1):
-        if world.logic[player] != 'nologic':
-            for key_layout in world.key_layout[player].values():
-                if not validate_key_placement(key_layout, world, player):
-                    raise RuntimeError(
-                      "%s: %s (%s %d)" %
-                      (
-                        world.fish.translate("cli", "cli", "keylock.detected"),
-                        key_layout.sector.name,
-                        world.fish.translate("cli", "cli", "player"),
-                        player
-                      )
-                    )
-
-    logger.info(world.fish.translate("cli","cli","fill.world"))
-
-    distribute_items_restrictive(world, True)
-
-    if world.players > 1:
-        logger.info(world.fish.translate("cli", "cli", "balance.multiworld"))
-        if args.algorithm in ['balanced', 'equitable']:
-            balance_multiworld_progression(world)
-
-    # if we only check for beatable, we can do this sanity check first before creating the rom
-    if not world.can_beat_game(log_error=True):
-        raise RuntimeError(world.fish.translate("cli", "cli", "cannot.beat.game"))
+            logger.info(world.fish.translate("cli","cli","placing.dungeon.items"))
+            profiler.stage('fill_dungeons')
 
+            if args.algorithm != 'equitable':
+                shuffled_locations = world.get_unfilled_locations()
+                random.shuffle(shuffled_locations)
+                fill_dungeons_restrictive(world, shuffled_locations)
+            else:
+                promote_dungeon_items(world)
+
+            for player in range(1, world.players+1):
+                if world.logic[player] != 'nologic':
+                    for key_layout in world.key_layout[player].values():
+                        if not validate_key_placement(key_layout, world, player):
+                            raise FillError(
+                              "%s: %s (%s %d)" %
+                              (
+                                world.fish.translate("cli", "cli", "keylock.detected"),
+                                key_layout.sector.name,
+                                world.fish.translate("cli", "cli", "player"),
+                                player
+                              )
+                            )
+
+            logger.info(world.fish.translate("cli","cli","fill.world"))
+            profiler.stage('distribute_items')
+
+            distribute_items_restrictive(world, True)
+
+            if world.players > 1:
+                logger.info(world.fish.translate("cli", "cli", "balance.multiworld"))
+                profiler.stage('balance_multiworld')
+                if args.algorithm in ['balanced', 'equitable']:
+                    balance_multiworld_progression(world)
+
+            # if we only check for beatable, we can do this sanity check first before creating the rom
+            profiler.stage('can_beat_game')
+            if not world.can_beat_game(log_error=True):
+                raise FillError(world.fish.translate("cli", "cli", "cannot.beat.game"))
+            break
+        except FillError as err:
+            # only placement failures are retried, anything else is a bug the seed has to reproduce
+            if world.fill_retries >= args.fill_retries:
+                raise
+            world.fill_retries += 1
+            logger.warning(world.fish.translate("cli", "cli", "fill.retry"), err, world.fill_retries, args.fill_retries)
+            restore_fill_stage(world, fill_checkpoint)
+            random.seed(f'{world.seed}-fill-{world.fill_retries}')
+
+    profiler.stage('customize_shops')
     for player in range(1, world.players+1):
         if world.shopsanity[player]:
             customize_shops(world, player)
+    profiler.stage('balance_money')
     if args.algorithm in ['balanced', 'equitable']:
         balance_money_progression(world)
     ensure_good_pots(world, True)
 
+    profiler.stage('patch_rom')
     rom_names = []
     jsonout = {}
     enemized = False
     if not args.suppress_rom or args.bps:
         logger.info(world.fish.translate("cli","cli","patching.rom"))
-        for team in range(world.teams):
+        if parallel_rom_output(world, args):
+            player_roms = output_roms_parallel(world, args, outfilebase)
+        else:
+            player_roms = []
             for player in range(1, world.players + 1):
-                sprite_random_on_hit = type(args.sprite[player]) is str and args.sprite[player].lower() == 'randomonhit'
-                use_enemizer = (world.boss_shuffle[player] != 'none' or world.enemy_shuffle[player] != 'none'
-                                or world.enemy_health[player] != 'default' or world.enemy_damage[player] != 'default'
-                                or sprite_random_on_hit)
-
-                rom = JsonRom() if args.jsonout or use_enemizer else LocalRom(args.rom)
-
-                if use_enemizer and (args.enemizercli or not args.jsonout):
-                    local_rom = LocalRom(args.rom)  # update base2current.json (side effect)
-                    if args.rom and not(os.path.isfile(args.rom)):
-                        raise RuntimeError("Could not find valid base rom for enemizing at expected path %s." % args.rom)
-                    if os.path.exists(args.enemizercli):
-                        patch_enemizer(world, player, rom, local_rom, args.enemizercli, sprite_random_on_hit)
-                        enemized = True
-                        if not args.jsonout:
-                            rom = LocalRom.fromJsonRom(rom, args.rom, 0x400000)
-                    else:
-                        enemizerMsg  = world.fish.translate("cli","cli","enemizer.not.found") + ': ' + args.enemizercli + "\n"
-                        enemizerMsg += world.fish.translate("cli","cli","enemizer.nothing.applied")
-                        logging.warning(enemizerMsg)
-                        raise EnemizerError(enemizerMsg)
-
-                patch_rom(world, rom, player, team, enemized, bool(args.mystery))
-
-                if args.race:
-                    patch_race_rom(rom)
-
-                rom_names.append((player, team, list(rom.name)))
-                world.spoiler.hashes[(player, team)] = get_hash_string(rom.hash)
-
-                apply_rom_settings(rom, args.heartbeep[player], args.heartcolor[player], args.quickswap[player],
-                                   args.fastmenu[player], args.disablemusic[player], args.sprite[player],
-                                   args.ow_palettes[player], args.uw_palettes[player], args.reduce_flashing[player],
-                                   args.shuffle_sfx[player], args.msu_resume[player])
-
+                enemized, team_roms = output_player_roms(world, args, player, enemized, outfilebase)
+                player_roms.append(team_roms)
+        # multidata, spoiler hashes and json patches are listed team by team
+        for team in range(world.teams):
+            for player, team_roms in enumerate(player_roms, 1):
+                _, rom_name, rom_hash, patches = team_roms[team]
+                rom_names.append((player, team, rom_name))
+                world.spoiler.hashes[(player, team)] = rom_hash
                 if args.jsonout:
-                    jsonout[f'patch_t{team}_p{player}'] = rom.patches
-                else:
-                    outfilepname = f'_T{team+1}' if world.teams > 1 else ''
-                    if world.players > 1:
-                        outfilepname += f'_P{player}'
-                    if world.players > 1 or world.teams > 1:
-                        outfilepname += f"_{world.player_names[player][team].replace(' ', '_')}" if world.player_names[player][team] != 'Player %d' % player else ''
-                    outfilesuffix = f'_{Settings.make_code(world, player)}' if not args.outputname else ''
-                    if args.bps:
-                        patchfile = output_path(f'{outfilebase}{outfilepname}{outfilesuffix}.bps')
-                        patch = create_bps_from_data(LocalRom(args.rom, patch=False).buffer, rom.buffer)
-                        with open(patchfile, 'wb') as stream:
-                            stream.write(patch.binary_ba)
-                    if not args.suppress_rom:
-                        sfc_file = output_path(f'{outfilebase}{outfilepname}{outfilesuffix}.sfc')
-                        rom.write_to_file(sfc_file)
+                    jsonout[f'patch_t{team}_p{player}'] = patches
 
         if world.players > 1:
             multidata = zlib.compress(json.dumps({"names": parsed_names,
@@ -341,6 +344,7 @@ def main(args, seed=None, fish=None):
                 with open(output_path('%s_multidata' % outfilebase), 'wb') as f:
                     f.write(multidata)
 
+    profiler.stage('spoiler')
     if args.mystery and not args.suppress_meta:
         world.spoiler.hashes_to_file(output_path(f'{outfilebase}_meta.txt'))
     elif args.create_spoiler and not args.jsonout:
@@ -351,8 +355,16 @@ def main(args, seed=None, fish=None):
 
     if not args.skip_playthrough:
         logger.info(world.fish.translate("cli","cli","calc.playthrough"))
+        profiler.stage('create_playthrough')
         create_playthrough(world)
 
+    profiler.finish()
+    if args.profile:
+        if args.jsonout:
+            jsonout['profile'] = profiler.parse_data()
+        else:
+            profiler.to_file(output_path(f'{outfilebase}_Profile.json'))
+
     if args.jsonout:
         print(json.dumps({**jsonout, 'spoiler': world.spoiler.to_json()}))
     elif args.create_spoiler:
@@ -372,6 +384,7 @@ def main(args, seed=None, fish=None):
     logger.info(world.fish.translate("cli","cli","made.playthrough") % (YES if (args.calc_playthrough) else NO))
     logger.info(world.fish.translate("cli","cli","made.spoiler") % (YES if (not args.jsonout and args.create_spoiler) else NO))
     logger.info(world.fish.translate("cli","cli","used.enemizer") % (YES if enemized else NO))
+    logger.info(world.fish.translate("cli","cli","fill.retries") % world.fill_retries)
     logger.info(world.fish.translate("cli","cli","seed") + ": %s", world.seed)
     logger.info(world.fish.translate("cli","cli","total.time"), time.perf_counter() - start)
 
@@ -381,6 +394,160 @@ def main(args, seed=None, fish=None):
     return world
 
 
+def needs_enemizer(world, args, player):
+    sprite_random_on_hit = type(args.sprite[player]) is str and args.sprite[player].lower() == 'randomonhit'
+    return (world.boss_shuffle[player] != 'none' or world.enemy_shuffle[player] != 'none'
+            or world.enemy_health[player] != 'default' or world.enemy_damage[player] != 'default'
+            or sprite_random_on_hit)
+
+
+def output_player_roms(world, args, player, enemized, outfilebase):
+    # builds and writes the roms of every team for one player
+    # returns the updated enemized flag and (team, rom name, hash string, json patches) for each team
+    sprite_random_on_hit = type(args.sprite[player]) is str and args.sprite[player].lower() == 'randomonhit'
+    use_enemizer = needs_enemizer(world, args, player)
+
+    rom = JsonRom() if args.jsonout or use_enemizer else LocalRom(args.rom)
+
+    if use_enemizer and (args.enemizercli or not args.jsonout):
+        local_rom = LocalRom(args.rom)  # update base2current.json (side effect)
+        if args.rom and not(os.path.isfile(args.rom)):
+            raise RuntimeError("Could not find valid base rom for enemizing at expected path %s." % args.rom)
+        if os.path.exists(args.enemizercli):
+            patch_enemizer(world, player, rom, local_rom, args.enemizercli, sprite_random_on_hit)
+            enemized = True
+            if not args.jsonout:
+                rom = LocalRom.fromJsonRom(rom, args.rom, 0x400000)
+        else:
+            enemizerMsg  = world.fish.translate("cli","cli","enemizer.not.found") + ': ' + args.enemizercli + "\n"
+            enemizerMsg += world.fish.translate("cli","cli","enemizer.nothing.applied")
+            logging.warning(enemizerMsg)
+            raise EnemizerError(enemizerMsg)
+
+    # everything up to the text tables is the same for every team, patch it once and copy it per team
+    random_state = patch_rom_shared(world, rom, player, enemized, bool(args.mystery))
+    shared_rom = rom
+
+    team_roms = []
+    for team in range(world.teams):
+        rom = shared_rom if team == world.teams - 1 else shared_rom.copy()
+        patch_rom_team(world, rom, player, team, random_state)
+
+        if args.race:
+            patch_race_rom(rom)
+
+        apply_rom_settings(rom, args.heartbeep[player], args.heartcolor[player], args.quickswap[player],
+                           args.fastmenu[player], args.disablemusic[player], args.sprite[player],
+                           args.ow_palettes[player], args.uw_palettes[player], args.reduce_flashing[player],
+                           args.shuffle_sfx[player], args.msu_resume[player])
+
+        team_roms.append((team, list(rom.name), get_hash_string(rom.hash), rom.patches if args.jsonout else None))
+
+        if not args.jsonout:
+            outfilepname = f'_T{team+1}' if world.teams > 1 else ''
+            if world.players > 1:
+                outfilepname += f'_P{player}'
+            if world.players > 1 or world.teams > 1:
+                outfilepname += f"_{world.player_names[player][team].replace(' ', '_')}" if world.player_names[player][team] != 'Player %d' % player else ''
+            outfilesuffix = f'_{Settings.make_code(world, player)}' if not args.outputname else ''
+            if args.bps:
+                patchfile = output_path(f'{outfilebase}{outfilepname}{outfilesuffix}.bps')
+                patch = create_bps_from_data(LocalRom(args.rom, patch=False).buffer, rom.buffer,
+                                             bps_encoders[args.bps_encoder])
+                with open(patchfile, 'wb') as stream:
+                    stream.write(patch.binary_ba)
+            if not args.suppress_rom:
+                sfc_file = output_path(f'{outfilebase}{outfilepname}{outfilesuffix}.sfc')
+                rom.write_to_file(sfc_file)
+    return enemized, team_roms
+
+
+def parallel_rom_output(world, args):
+    if args.rom_workers is None or args.rom_workers < 2 or world.players < 2:
+        return False
+    # the world is handed to the workers by forking, and pool workers cannot start pools of their own
+    if 'fork' not in multiprocessing.get_all_start_methods() or multiprocessing.current_process().daemon:
+        return False
+    # the enemizer draws from the random state the previous player's roms left behind, so those roms are built in order
+    return not any(needs_enemizer(world, args, player) for player in range(1, world.players + 1))
+
+
+output_world, output_args = None, None
+
+
+def init_output_worker(world, args):
+    global output_world, output_args
+    output_world, output_args = world, args
+
+
+def output_player_job(job):
+    player, outfilebase = job
+    # in serial mode the roms patched before this one have already picked their silver arrow hint bows
+    distinguish_progressive_bows(output_world, range(1, player))
+    return output_player_roms(output_world, output_args, player, False, outfilebase)[1]
+
+
+def distinguish_progressive_bows(world, players):
+    for player in players:
+        random.seed(world.rom_seeds[player])
+        distinguish_progressive_bow(world, player)
+
+
+def output_roms_parallel(world, args, outfilebase):
+    # each player gets a fresh fork of the world as it was before any rom was patched
+    context = multiprocessing.get_context('fork')
+    with context.Pool(min(args.rom_workers, world.players), initializer=init_output_worker,
+                      initargs=(world, args), maxtasksperchild=1) as pool:
+        player_roms = pool.map(output_player_job, [(player, outfilebase) for player in range(1, world.players + 1)],
+                               chunksize=1)
+    distinguish_progressive_bows(world, range(1, world.players + 1))
+    return player_roms
+
+
+def checkpoint_fill_stage(world):
+    # records everything the prize, dungeon item and main fills modify so a failed fill can be undone:
+    #   every location's item, event and locked flags
+    #   every item's location, world, player, advancement and priority
+    #   the item pool and the base collection state
+    #   each player's pot multiworld count, key logic outside keys and dungeon layout item counts
+    # nothing else is restored, so anything the fill stage starts to modify has to be added here
+    items = set(world.itempool)
+    for location in world.get_locations():
+        if location.item is not None:
+            items.add(location.item)
+    for dungeon in world.dungeons:
+        items.update(dungeon.all_items)
+    return {
+        'locations': [(location, location.item, location.event, location.locked) for location in world.get_locations()],
+        'items': [(item, item.location, item.world, item.player, item.advancement, item.priority) for item in items],
+        'itempool': list(world.itempool),
+        'state': world.state.copy(),
+        'pot_counts': {player: pots.multiworld_count for player, pots in world.pot_contents.items()},
+        'outside_keys': {(player, name): logic.outside_keys
+                         for player, dungeons in world.key_logic.items() for name, logic in dungeons.items()},
+        'layouts': {(player, name): (layout.dungeon_items, layout.free_items)
+                    for player, layouts in world.dungeon_layouts.items() for name, layout in layouts.items()},
+    }
+
+
+def restore_fill_stage(world, checkpoint):
+    for location, item, event, locked in checkpoint['locations']:
+        location.item, location.event, location.locked = item, event, locked
+    for item, location, item_world, player, advancement, priority in checkpoint['items']:
+        item.location, item.world, item.player = location, item_world, player
+        item.advancement, item.priority = advancement, priority
+    world.itempool = list(checkpoint['itempool'])
+    world.state = checkpoint['state'].copy()
+    for player, count in checkpoint['pot_counts'].items():
+        world.pot_contents[player].multiworld_count = count
+    for (player, name), outside_keys in checkpoint['outside_keys'].items():
+        world.key_logic[player][name].outside_keys = outside_keys
+    for (player, name), (dungeon_items, free_items) in checkpoint['layouts'].items():
+        layout = world.dungeon_layouts[player][name]
+        layout.dungeon_items, layout.free_items = dungeon_items, free_items
+    world.clear_exp_cache()
+
+
 def copy_world(world):
     # ToDo: Not good yet
     ret = World(world.players, world.shuffle, world.doorShuffle, world.logic, world.mode, world.swords,
@@ -566,19 +733,15 @@ def create_playthrough(world):
     state_cache = [None]
     collection_spheres = []
     state = CollectionState(world)
-    sphere_candidates = list(prog_locations)
+    sphere_candidates = SphereIterator(state, prog_locations)
     logging.getLogger('').debug(world.fish.translate("cli","cli","building.collection.spheres"))
     while sphere_candidates:
         state.sweep_for_events(key_only=True)
 
-        sphere = set()
         # build up spheres of collection radius. Everything in each sphere is independent from each other in dependencies and only depends on lower spheres
-        for location in sphere_candidates:
-            if state.can_reach(location) and state.not_flooding_a_key(world, location):
-                sphere.add(location)
+        sphere = set(sphere_candidates.next_sphere())
 
         for location in sphere:
-            sphere_candidates.remove(location)
             state.collect(location.item, True, location)
 
         collection_spheres.append(sphere)
@@ -587,16 +750,23 @@ def create_playthrough(world):
 
         logging.getLogger('').debug(world.fish.translate("cli", "cli", "building.calculating.spheres"), len(collection_spheres), len(sphere), len(prog_locations))
         if not sphere:
-            logging.getLogger('').error(world.fish.translate("cli", "cli", "cannot.reach.items"), [world.fish.translate("cli","cli","cannot.reach.item") % (location.item.name, location.item.player, location.name, location.player) for location in sphere_candidates])
-            if any([location.name not in optional_locations and world.accessibility[location.item.player] != 'none' for location in sphere_candidates]):
+            logging.getLogger('').error(world.fish.translate("cli", "cli", "cannot.reach.items"), [world.fish.translate("cli","cli","cannot.reach.item") % (location.item.name, location.item.player, location.name, location.player) for location in sphere_candidates.remaining])
+            if any([location.name not in optional_locations and world.accessibility[location.item.player] != 'none' for location in sphere_candidates.remaining]):
                 raise RuntimeError(world.fish.translate("cli", "cli", "cannot.reach.progression"))
             else:
-                old_world.spoiler.unreachables = sphere_candidates.copy()
+                old_world.spoiler.unreachables = list(sphere_candidates.remaining)
                 break
 
     # in the second phase, we cull each sphere such that the game is still beatable, reducing each range of influence to the bare minimum required inside it
+    # every item is still tested on its own: the result depends on the order of the removals and beatability is not
+    # monotone once key rules read placement, so neither bisection nor skipping copies of a required item is exact
     for num, sphere in reversed(list(enumerate(collection_spheres))):
         to_delete = set()
+        # every candidate in the sphere is tested from the same state, so explore it once instead of in each copy
+        sphere_state = state_cache[num] if state_cache[num] is not None else CollectionState(world)
+        for player in range(1, world.players + 1):
+            if sphere_state.stale[player]:
+                sphere_state.update_reachable_regions(player)
         for location in sphere:
             # we remove the item at location and check if game is still beatable
             logging.getLogger('').debug('Checking if %s (Player %d) is required to beat the game.', location.item.name, location.item.player)
@@ -604,7 +774,7 @@ def create_playthrough(world):
             location.item = None
             # todo: this is not very efficient, but I'm not sure how else to do it for this backwards logic
             # world.clear_exp_cache()
-            if world.can_beat_game(state_cache[num]):
+            if world.can_beat_game(sphere_state):
                 logging.getLogger('').debug(f'{old_item.name} (Player {old_item.player}) is not required')
                 to_delete.add(location)
             else:
@@ -629,24 +799,23 @@ def create_playthrough(world):
     # used to access it was deemed not required.) So we need to do one final sphere collection pass
     # to build up the correct spheres
 
-    required_locations = {item for sphere in collection_spheres for item in sphere}
     state = CollectionState(world)
+    required_locations = SphereIterator(state, {item for sphere in collection_spheres for item in sphere})
     collection_spheres = []
     while required_locations:
         state.sweep_for_events(key_only=True)
 
-        sphere = list(filter(lambda loc: state.can_reach(loc) and state.not_flooding_a_key(world, loc), required_locations))
+        sphere = required_locations.next_sphere()
 
         for location in sphere:
-            required_locations.remove(location)
             state.collect(location.item, True, location)
 
         collection_spheres.append(sphere)
 
-        logging.getLogger('').debug(world.fish.translate("cli","cli","building.final.spheres"), len(collection_spheres), len(sphere), len(required_locations))
+        logging.getLogger('').debug(world.fish.translate("cli","cli","building.final.spheres"), len(collection_spheres), len(sphere), len(required_locations.remaining))
         if not sphere:
             if world.has_beaten_game(state):
-                required_locations.clear()
+                break
             else:
                 raise RuntimeError(world.fish.translate("cli","cli","cannot.reach.required"))
 
@@ -65,6 +65,8 @@ class Context:
 
         self.lookup_name_to_id = {}
         self.lookup_id_to_name = {}
+        # scouts name locations by their 1 based position in lookup_id_to_name, (id, name) for each position
+        self.lookup_scout_locations = []
 
 def color_code(*args):
     codes = {'reset': 0, 'bold': 1, 'underline': 4, 'black': 30, 'red': 31, 'green': 32, 'yellow': 33, 'blue': 34,
@@ -714,7 +716,7 @@ async def process_server_cmd(ctx : Context, cmd, args):
             if location not in ctx.locations_info:
                 replacements = {0xA2: 'Small Key', 0x9D: 'Big Key', 0x8D: 'Compass', 0x7D: 'Map'}
                 item_name = replacements.get(item, get_item_name_from_id(item))
-                logging.info(f"Saw {color(item_name, 'red', 'bold')} at {list(ctx.lookup_id_to_name.keys())[location - 1]}")
+                logging.info(f"Saw {color(item_name, 'red', 'bold')} at {ctx.lookup_scout_locations[location - 1][1]}")
                 ctx.locations_info[location] = (item, player)
         ctx.watcher_event.set()
 
@@ -813,9 +815,15 @@ async def console_loop(ctx : Context):
         await snes_flush_writes(ctx)
 
 
+# first item table entry for each item code, several items share a code
+item_names_by_id = {}
+for item_name, item_data in Items.item_table.items():
+    if type(item_data[3]) is int:
+        item_names_by_id.setdefault(item_data[3], item_name)
+
+
 def get_item_name_from_id(code):
-    items = [k for k, i in Items.item_table.items() if type(i[3]) is int and i[3] == code]
-    return items[0] if items else f'Unknown item (ID:{code})'
+    return item_names_by_id.get(code, f'Unknown item (ID:{code})')
 
 
 def get_location_name_from_address(ctx, address):
@@ -862,6 +870,7 @@ def init_lookups(ctx):
                 location_id = Regions.pot_address(pot_index, super_tile)
                 ctx.lookup_name_to_id[loc_name] = location_id
                 ctx.lookup_id_to_name[location_id] = loc_name
+    ctx.lookup_scout_locations = list(ctx.lookup_id_to_name.items())
 
 
 async def track_locations(ctx : Context, roomid, roomdata):
@@ -1032,7 +1041,7 @@ async def game_watcher(ctx : Context):
 
         if scout_location > 0 and scout_location not in ctx.locations_scouted:
             ctx.locations_scouted.add(scout_location)
-            logging.info(f'Scouting item at {list(ctx.lookup_id_to_name.keys())[scout_location - 1]}')
+            logging.info(f'Scouting item at {ctx.lookup_scout_locations[scout_location - 1][1]}')
             await send_msgs(ctx.socket, [['LocationScouts', [scout_location]]])
         await track_locations(ctx, roomid, roomdata)
 
@@ -4,6 +4,7 @@ import asyncio
 import functools
 import json
 import logging
+import os
 import re
 import shlex
 import ssl
@@ -17,6 +18,11 @@ import Regions
 import PotShuffle
 from MultiClient import ReceivedItem, get_item_name_from_id, get_location_name_from_address
 
+# received items are appended to the journal as they arrive, and folded into the save file once it holds this many
+journal_compact_records = 1000
+# messages waiting for one client, a client this far behind is dropped
+client_send_queue_size = 10000
+
 class Client:
     def __init__(self, socket):
         self.socket = socket
@@ -25,11 +31,14 @@ class Client:
         self.team = None
         self.slot = None
         self.send_index = 0
+        self.send_queue = asyncio.Queue(client_send_queue_size)
+        self.send_task = None
 
 class Context:
     def __init__(self, host, port, password):
         self.data_filename = None
         self.save_filename = None
+        self.journal_filename = None
         self.disable_save = False
         self.player_names = {}
         self.rom_names = {}
@@ -42,30 +51,71 @@ class Context:
         self.countdown_timer = 0
         self.clients = []
         self.received_items = {}
+        # the same items as (item, location, sender) tuples for the clients, and their (location, sender) pairs
+        self.received_item_tuples = {}
+        self.received_item_keys = {}
+        self.journal_pending = []
+        self.journal_records = 0
+        self.journal_task = None
+        self.send_queue_peak = 0
+        self.dropped_clients = 0
 
         self.lookup_name_to_id = {}
         self.lookup_id_to_name = {}
+        # scouts name locations by their 1 based position in lookup_id_to_name, (id, name) for each position
+        self.lookup_scout_locations = []
+        self.lookup_item_type = {}
 
         self.disable_client_forfeit = False
 
 
-async def send_msgs(websocket, msgs):
-    if not websocket or not websocket.open or websocket.closed:
+async def client_sender(client : Client):
+    # the only writer of a client's socket, so a slow client holds up nothing but its own queue
+    queue = client.send_queue
+    while True:
+        data = await queue.get()
+        if client.send_queue is None:
+            continue  # closed or dropped, keep draining so nothing waits on the queue
+        try:
+            await client.socket.send(data)
+        except websockets.ConnectionClosed:
+            client.send_queue = None
+
+def track_send_queue(ctx : Context, client : Client):
+    depth = client.send_queue.qsize()
+    if depth > ctx.send_queue_peak:
+        ctx.send_queue_peak = depth
+
+async def send_msgs(ctx : Context, client : Client, msgs):
+    # never waits for room: whoever is sending, a client that is too far behind is dropped rather than stalling them
+    queue_msgs(ctx, client, msgs)
+
+def queue_data(ctx : Context, client : Client, data):
+    if client.send_queue is None:
         return
     try:
-        await websocket.send(json.dumps(msgs))
-    except websockets.ConnectionClosed:
-        pass
+        client.send_queue.put_nowait(data)
+    except asyncio.QueueFull:
+        logging.warning('Dropping %s, %d messages behind' % (client.name, client.send_queue.qsize()))
+        ctx.dropped_clients += 1
+        client.send_queue = None
+        asyncio.create_task(client.socket.close())
+        return
+    track_send_queue(ctx, client)
+
+def queue_msgs(ctx : Context, client : Client, msgs):
+    queue_data(ctx, client, json.dumps(msgs))
+
+def broadcast(ctx : Context, clients, msgs):
+    data = json.dumps(msgs)
+    for client in clients:
+        queue_data(ctx, client, data)
 
 def broadcast_all(ctx : Context, msgs):
-    for client in ctx.clients:
-        if client.auth:
-            asyncio.create_task(send_msgs(client.socket, msgs))
+    broadcast(ctx, [client for client in ctx.clients if client.auth], msgs)
 
 def broadcast_team(ctx : Context, team, msgs):
-    for client in ctx.clients:
-        if client.auth and client.team == team:
-            asyncio.create_task(send_msgs(client.socket, msgs))
+    broadcast(ctx, [client for client in ctx.clients if client.auth and client.team == team], msgs)
 
 def notify_all(ctx : Context, text):
     logging.info("Notice (all): %s" % text)
@@ -75,14 +125,15 @@ def notify_team(ctx : Context, team : int, text : str):
     logging.info("Notice (Team #%d): %s" % (team+1, text))
     broadcast_team(ctx, team, [['Print', text]])
 
-def notify_client(client : Client, text : str):
+def notify_client(ctx : Context, client : Client, text : str):
     if not client.auth:
         return
     logging.info("Notice (Player %s in team %d): %s" % (client.name, client.team+1, text))
-    asyncio.create_task(send_msgs(client.socket,  [['Print', text]]))
+    queue_msgs(ctx, client, [['Print', text]])
 
 async def server(websocket, path, ctx : Context):
     client = Client(websocket)
+    client.send_task = asyncio.create_task(client_sender(client))
     ctx.clients.append(client)
 
     try:
@@ -90,7 +141,7 @@ async def server(websocket, path, ctx : Context):
         async for data in websocket:
             for msg in json.loads(data):
                 if len(msg) == 1:
-                    cmd = msg
+                    cmd = msg[0]
                     args = None
                 else:
                     cmd = msg[0]
@@ -102,9 +153,10 @@ async def server(websocket, path, ctx : Context):
     finally:
         await on_client_disconnected(ctx, client)
         ctx.clients.remove(client)
+        client.send_task.cancel()
 
 async def on_client_connected(ctx : Context, client : Client):
-    await send_msgs(client.socket, [['RoomInfo', {
+    await send_msgs(ctx, client, [['RoomInfo', {
         'password': ctx.password is not None,
         'players': [(client.team, client.slot, client.name) for client in ctx.clients if client.auth]
     }]])
@@ -150,16 +202,39 @@ def get_connected_players_string(ctx : Context):
 def get_received_items(ctx : Context, team, player):
     return ctx.received_items.setdefault((team, player), [])
 
+def get_received_item_tuples(ctx : Context, team, player):
+    return ctx.received_item_tuples.setdefault((team, player), [])
+
+def has_received_item(ctx : Context, team, player, location, sender):
+    keys = ctx.received_item_keys.get((team, player))
+    return keys is not None and (location, sender) in keys
+
+def store_received_item(ctx : Context, team, player, item):
+    get_received_items(ctx, team, player).append(item)
+    get_received_item_tuples(ctx, team, player).append((item.item, item.location, item.player))
+    ctx.received_item_keys.setdefault((team, player), set()).add((item.location, item.player))
+
+def add_received_item(ctx : Context, team, player, item):
+    if not ctx.disable_save:
+        # the index lets a replay skip records the save file already holds
+        ctx.journal_pending.append([team, player, len(get_received_items(ctx, team, player)),
+                                    item.item, item.location, item.player])
+    store_received_item(ctx, team, player, item)
+
 def tuplize_received_items(items):
     return [(item.item, item.location, item.player) for item in items]
 
+def index_received_items(ctx : Context):
+    ctx.received_item_tuples = {k: tuplize_received_items(v) for k, v in ctx.received_items.items()}
+    ctx.received_item_keys = {k: {(item.location, item.player) for item in v} for k, v in ctx.received_items.items()}
+
 def send_new_items(ctx : Context):
     for client in ctx.clients:
         if not client.auth:
             continue
-        items = get_received_items(ctx, client.team, client.slot)
+        items = get_received_item_tuples(ctx, client.team, client.slot)
         if len(items) > client.send_index:
-            asyncio.create_task(send_msgs(client.socket, [['ReceivedItems', (client.send_index, tuplize_received_items(items)[client.send_index:])]]))
+            queue_msgs(ctx, client, [['ReceivedItems', (client.send_index, items[client.send_index:])]])
             client.send_index = len(items)
 
 def forfeit_player(ctx : Context, team, slot):
@@ -173,15 +248,9 @@ def register_location_checks(ctx : Context, team, slot, locations):
         if (location, slot) in ctx.locations:
             target_item, target_player = ctx.locations[(location, slot)]
             if target_player != slot or slot in ctx.remote_items:
-                found = False
-                recvd_items = get_received_items(ctx, team, target_player)
-                for recvd_item in recvd_items:
-                    if recvd_item.location == location and recvd_item.player == slot:
-                        found = True
-                        break
-                if not found:
+                if not has_received_item(ctx, team, target_player, location, slot):
                     new_item = ReceivedItem(target_item, location, slot)
-                    recvd_items.append(new_item)
+                    add_received_item(ctx, team, target_player, new_item)
                     if slot != target_player:
                         broadcast_team(ctx, team, [['ItemSent', (slot, location, target_player, target_item)]])
                         loc_name = get_location_name_from_address(ctx, location)
@@ -189,25 +258,121 @@ def register_location_checks(ctx : Context, team, slot, locations):
                     found_items = True
     send_new_items(ctx)
 
-    if found_items and not ctx.disable_save:
+    if found_items:
+        save_received_items(ctx)
+
+def save_received_items(ctx : Context):
+    # the writer keeps going until nothing is pending, so one running writer picks up new records too
+    if ctx.disable_save or not ctx.journal_pending or (ctx.journal_task and not ctx.journal_task.done()):
+        return
+    ctx.journal_task = asyncio.create_task(journal_writer(ctx))
+
+async def journal_writer(ctx : Context):
+    loop = asyncio.get_running_loop()
+    while ctx.journal_pending:
+        records, ctx.journal_pending = ctx.journal_pending, []
         try:
-            with open(ctx.save_filename, "wb") as f:
-                jsonstr = json.dumps((list(ctx.rom_names.items()),
-                                      [(k, [i.__dict__ for i in v]) for k, v in ctx.received_items.items()]))
-                f.write(zlib.compress(jsonstr.encode("utf-8")))
+            await loop.run_in_executor(None, write_journal, ctx.journal_filename, records)
+            ctx.journal_records += len(records)
+            if ctx.journal_records >= journal_compact_records:
+                received_items = [(k, list(v)) for k, v in ctx.received_items.items()]
+                await loop.run_in_executor(None, write_save_file, ctx.save_filename, ctx.journal_filename,
+                                           list(ctx.rom_names.items()), received_items)
+                ctx.journal_records = 0
         except Exception as e:
             logging.exception(e)
 
+def write_journal(journal_filename, records):
+    with open(journal_filename, 'a') as f:
+        f.write(''.join(json.dumps(record) + '\n' for record in records))
+        f.flush()
+        os.fsync(f.fileno())
+
+def start_journal(journal_filename, rom_names):
+    # the first line ties the journal to the multidata like the rom names in the save file do
+    with open(journal_filename, 'w') as f:
+        f.write(json.dumps(rom_names) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+
+def write_save_file(save_filename, journal_filename, rom_names, received_items):
+    jsonstr = json.dumps((rom_names, [(k, [i.__dict__ for i in v]) for k, v in received_items]))
+    with open(save_filename + '.tmp', 'wb') as f:
+        f.write(zlib.compress(jsonstr.encode("utf-8")))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(save_filename + '.tmp', save_filename)
+    start_journal(journal_filename, rom_names)
+
+def load_journal(ctx : Context):
+    # returns how many received items were replayed and whether new records can be appended to the journal as it is
+    try:
+        with open(ctx.journal_filename, 'r') as f:
+            lines = f.read().split('\n')
+    except FileNotFoundError:
+        return 0, False
+    try:
+        rom_names = json.loads(lines[0])
+    except ValueError:
+        return 0, False
+    if not all([ctx.rom_names.get(tuple(rom)) == (team, slot) for rom, (team, slot) in rom_names]):
+        logging.info('Journal mismatch, it will not be replayed')
+        return 0, False
+    replayed, records = 0, 0
+    for line in lines[1:]:
+        try:
+            team, player, index, item, location, sender = json.loads(line)
+        except ValueError:
+            break  # the last line of a journal can be cut short by a crash
+        items = get_received_items(ctx, team, player)
+        if index > len(items):
+            logging.error('Journal is missing received items for team %d player %d, stopping the replay' % (team + 1, player))
+            return replayed, False
+        if index == len(items):
+            store_received_item(ctx, team, player, ReceivedItem(item, location, sender))
+            replayed += 1
+        records += 1
+    ctx.journal_records = records
+    # a record appended after a cut off line would be lost with it, so only a journal that ends on a full line is kept
+    return replayed, records == len(lines) - 2 and lines[-1] == ''
+
+def load_save_file(ctx : Context):
+    if not ctx.save_filename:
+        ctx.save_filename = (ctx.data_filename[:-9] if ctx.data_filename[-9:] == 'multidata' else (ctx.data_filename + '_')) + 'multisave'
+    try:
+        with open(ctx.save_filename, 'rb') as f:
+            jsonobj = json.loads(zlib.decompress(f.read()).decode("utf-8"))
+            rom_names = jsonobj[0]
+            received_items = {tuple(k): [ReceivedItem(**i) for i in v] for k, v in jsonobj[1]}
+            if not all([ctx.rom_names[tuple(rom)] == (team, slot) for rom, (team, slot) in rom_names]):
+                raise Exception('Save file mismatch, will start a new game')
+            ctx.received_items = received_items
+            index_received_items(ctx)
+            logging.info('Loaded save file with %d received items for %d players' % (sum([len(p) for p in received_items.values()]), len(received_items)))
+    except FileNotFoundError:
+        logging.error('No save data found, starting a new game')
+    except Exception as e:
+        logging.info(e)
+    ctx.journal_filename = ctx.save_filename + '.journal'
+    replayed, intact = load_journal(ctx)
+    if replayed:
+        logging.info('Replayed %d received items from the journal' % replayed)
+        write_save_file(ctx.save_filename, ctx.journal_filename, list(ctx.rom_names.items()), list(ctx.received_items.items()))
+        ctx.journal_records = 0
+    elif not intact:
+        start_journal(ctx.journal_filename, list(ctx.rom_names.items()))
+        ctx.journal_records = 0
+
 async def process_client_cmd(ctx : Context, client : Client, cmd, args):
     if type(cmd) is not str:
-        await send_msgs(client.socket, [['InvalidCmd']])
+        await send_msgs(ctx, client, [['InvalidCmd']])
         return
 
     if cmd == 'Connect':
         if not args or type(args) is not dict or \
                 'password' not in args or type(args['password']) not in [str, type(None)] or \
                 'rom' not in args or type(args['rom']) is not list:
-            await send_msgs(client.socket, [['InvalidArguments', 'Connect']])
+            await send_msgs(ctx, client, [['InvalidArguments', 'Connect']])
             return
 
         errors = set()
@@ -226,57 +391,57 @@ async def process_client_cmd(ctx : Context, client : Client, cmd, args):
                 client.slot = slot
 
         if errors:
-            await send_msgs(client.socket, [['ConnectionRefused', list(errors)]])
+            await send_msgs(ctx, client, [['ConnectionRefused', list(errors)]])
         else:
             client.auth = True
             reply = [['Connected', [(client.team, client.slot), [(p, n) for (t, p), n in ctx.player_names.items() if t == client.team]]]]
-            items = get_received_items(ctx, client.team, client.slot)
+            items = get_received_item_tuples(ctx, client.team, client.slot)
             if items:
-                reply.append(['ReceivedItems', (0, tuplize_received_items(items))])
+                reply.append(['ReceivedItems', (0, items)])
                 client.send_index = len(items)
-            await send_msgs(client.socket, reply)
+            await send_msgs(ctx, client, reply)
             await on_client_joined(ctx, client)
 
     if not client.auth:
         return
 
     if cmd == 'Sync':
-        items = get_received_items(ctx, client.team, client.slot)
+        items = get_received_item_tuples(ctx, client.team, client.slot)
         if items:
             client.send_index = len(items)
-            await send_msgs(client.socket, [['ReceivedItems', (0, tuplize_received_items(items))]])
+            await send_msgs(ctx, client, [['ReceivedItems', (0, items)]])
 
     if cmd == 'LocationChecks':
         if type(args) is not list:
-            await send_msgs(client.socket, [['InvalidArguments', 'LocationChecks']])
+            await send_msgs(ctx, client, [['InvalidArguments', 'LocationChecks']])
             return
         register_location_checks(ctx, client.team, client.slot, args)
 
     if cmd == 'LocationScouts':
         if type(args) is not list:
-            await send_msgs(client.socket, [['InvalidArguments', 'LocationScouts']])
+            await send_msgs(ctx, client, [['InvalidArguments', 'LocationScouts']])
             return
+        replacements = {'SmallKey': 0xA2, 'BigKey': 0x9D, 'Compass': 0x8D, 'Map': 0x7D}
         locs = []
         for location in args:
-            if type(location) is not int or 0 >= location > len(ctx.lookup_id_to_name.keys()):
-                await send_msgs(client.socket, [['InvalidArguments', 'LocationScouts']])
+            if type(location) is not int or not 0 < location <= len(ctx.lookup_scout_locations):
+                await send_msgs(ctx, client, [['InvalidArguments', 'LocationScouts']])
                 return
-            loc_name = list(ctx.lookup_id_to_name.keys())[location - 1]
-            target_item, target_player = ctx.locations[(ctx.lookup_name_to_id[loc_name], client.slot)]
-
-            replacements = {'SmallKey': 0xA2, 'BigKey': 0x9D, 'Compass': 0x8D, 'Map': 0x7D}
-            item_type = [i[2] for i in Items.item_table.values() if type(i[3]) is int and i[3] == target_item]
-            if item_type:
-                target_item = replacements.get(item_type[0], target_item)
+            location_id, loc_name = ctx.lookup_scout_locations[location - 1]
+            if (location_id, client.slot) not in ctx.locations:
+                await send_msgs(ctx, client, [['InvalidArguments', 'LocationScouts']])
+                return
+            target_item, target_player = ctx.locations[(location_id, client.slot)]
+            target_item = replacements.get(ctx.lookup_item_type.get(target_item), target_item)
 
             locs.append([loc_name, location, target_item, target_player])
 
         logging.info(f"{client.name} in team {client.team+1} scouted {', '.join([l[0] for l in locs])}")
-        await send_msgs(client.socket, [['LocationInfo', [l[1:] for l in locs]]])
+        await send_msgs(ctx, client, [['LocationInfo', [l[1:] for l in locs]]])
 
     if cmd == 'Say':
         if type(args) is not str or not args.isprintable():
-            await send_msgs(client.socket, [['InvalidArguments', 'Say']])
+            await send_msgs(ctx, client, [['InvalidArguments', 'Say']])
             return
 
         notify_all(ctx, client.name + ': ' + args)
@@ -285,7 +450,7 @@ async def process_client_cmd(ctx : Context, client : Client, cmd, args):
             notify_all(ctx, get_connected_players_string(ctx))
         if args.startswith('!forfeit'):
             if ctx.disable_client_forfeit:
-                notify_client(client, 'Client-initiated forfeits are disabled.  Please ask the host of this game to forfeit on your behalf.')
+                notify_client(ctx, client, 'Client-initiated forfeits are disabled.  Please ask the host of this game to forfeit on your behalf.')
             else:
                 forfeit_player(ctx, client.team, client.slot)
         if args.startswith('!countdown'):
@@ -313,6 +478,10 @@ async def console(ctx : Context):
 
         if command[0] == '/players':
             logging.info(get_connected_players_string(ctx))
+        if command[0] == '/queues':
+            depths = ', '.join('%s: %d' % (client.name, client.send_queue.qsize()) for client in ctx.clients
+                               if client.auth and client.send_queue is not None)
+            logging.info('Send queues: %s (peak %d, %d clients dropped)' % (depths or 'none', ctx.send_queue_peak, ctx.dropped_clients))
         if command[0] == '/password':
             set_password(ctx, command[1] if len(command) > 1 else None)
         if command[0] == '/kick' and len(command) > 1:
@@ -342,9 +511,10 @@ async def console(ctx : Context):
                 for client in ctx.clients:
                     if client.auth and client.name.lower() == player.lower():
                         new_item = ReceivedItem(Items.item_table[item][3], "cheat console", client.slot)
-                        get_received_items(ctx, client.team, client.slot).append(new_item)
+                        add_received_item(ctx, client.team, client.slot, new_item)
                         notify_all(ctx, 'Cheat console: sending "' + item + '" to ' + client.name)
                 send_new_items(ctx)
+                save_received_items(ctx)
             else:
                 logging.warning("Unknown item: " + item)
 
@@ -373,6 +543,11 @@ def init_lookups(ctx):
                 location_id = Regions.pot_address(pot_index, super_tile)
                 ctx.lookup_name_to_id[loc_name] = location_id
                 ctx.lookup_id_to_name[location_id] = loc_name
+    ctx.lookup_scout_locations = list(ctx.lookup_id_to_name.items())
+    # type of the first item table entry with each code, scouted dungeon items are shown by type
+    for item_data in Items.item_table.values():
+        if isinstance(item_data[3], int):
+            ctx.lookup_item_type.setdefault(item_data[3], item_data[2])
 
 
 async def main():
@@ -417,21 +592,7 @@ async def main():
 
     ctx.disable_save = args.disable_save
     if not ctx.disable_save:
-        if not ctx.save_filename:
-            ctx.save_filename = (ctx.data_filename[:-9] if ctx.data_filename[-9:] == 'multidata' else (ctx.data_filename + '_')) + 'multisave'
-        try:
-            with open(ctx.save_filename, 'rb') as f:
-                jsonobj = json.loads(zlib.decompress(f.read()).decode("utf-8"))
-                rom_names = jsonobj[0]
-                received_items = {tuple(k): [ReceivedItem(**i) for i in v] for k, v in jsonobj[1]}
-                if not all([ctx.rom_names[tuple(rom)] == (team, slot) for rom, (team, slot) in rom_names]):
-                    raise Exception('Save file mismatch, will start a new game')
-                ctx.received_items = received_items
-                logging.info('Loaded save file with %d received items for %d players' % (sum([len(p) for p in received_items.values()]), len(received_items)))
-        except FileNotFoundError:
-            logging.error('No save data found, starting a new game')
-        except Exception as e:
-            logging.info(e)
+        load_save_file(ctx)
 
     ctx.server = websockets.serve(functools.partial(server,ctx=ctx), ctx.host, ctx.port, ping_timeout=None, ping_interval=None)
     await ctx.server
@@ -1,5 +1,5 @@
-import bisect
 import collections
+import copy
 import io
 import json
 import hashlib
@@ -26,7 +26,7 @@ from Text import Triforce_texts, Blind_texts, BombShop2_texts, junk_texts
 from Text import KingsReturn_texts, Sanctuary_texts, Kakariko_texts, Blacksmiths_texts, DeathMountain_texts
 from Text import LostWoods_texts, WishingWell_texts, DesertPalace_texts, MountainTower_texts, LinksHouse_texts
 from Text import Lumberjacks_texts, SickKid_texts, FluteBoy_texts, Zora_texts, MagicShop_texts, Sahasrahla_names
-from Utils import output_path, local_path, int16_as_bytes, int32_as_bytes, snes_to_pc
+from Utils import output_path, local_path, int16_as_bytes, int32_as_bytes, snes_to_pc, byte_sum, changed_runs
 from Items import ItemFactory
 from EntranceShuffle import door_addresses, exit_ids, ow_prize_table
 from InitialSram import InitialSram
@@ -39,6 +39,9 @@ from source.dungeon.RoomList import Room0127
 JAP10HASH = '03a63945398191337e896e5771f77173'
 RANDOMIZERBASEHASH = 'e30a2490da811232e0a438da8fa662ee'
 
+# patched base rom images by base rom and base patch md5, every LocalRom of a run starts from a copy of one
+patched_base_roms = {}
+
 
 class JsonRom(object):
 
@@ -46,8 +49,12 @@ class JsonRom(object):
         self.name = name
         self.hash = hash
         self.orig_buffer = None
-        self.patches = {}
-        self.addresses = []
+        # written bytes over a zeroed image, written[i] is 1 for every byte that has been written
+        self.buffer = bytearray()
+        self.written = bytearray()
+        # order in which patch start addresses were first written to, the json lists patches in that order
+        self.starts = {}
+        self._patches = None
         self.initial_sram = InitialSram()
 
     def write_byte(self, address, value):
@@ -56,31 +63,43 @@ class JsonRom(object):
     def write_bytes(self, startaddress, values):
         if not values:
             return
-        values = list(values)
-
-        pos = bisect.bisect_right(self.addresses, startaddress)
-        intervalstart = self.addresses[pos-1] if pos else None
-        intervalpatch = self.patches[str(intervalstart)] if pos else None
-
-        if pos and startaddress <= intervalstart + len(intervalpatch): # merge with previous segment
-            offset = startaddress - intervalstart
-            intervalpatch[offset:offset+len(values)] = values
-            startaddress = intervalstart
-            values = intervalpatch
-        else: # new segment
-            self.addresses.insert(pos, startaddress)
-            self.patches[str(startaddress)] = values
-            pos = pos + 1
-
-        while pos < len(self.addresses) and self.addresses[pos] <= startaddress + len(values): # merge the next segment into this one
-            intervalstart = self.addresses[pos]
-            values.extend(self.patches[str(intervalstart)][startaddress+len(values)-intervalstart:])
-            del self.patches[str(intervalstart)]
-            del self.addresses[pos]
+        values = bytes(values)
+        end = startaddress + len(values)
+        if end > len(self.buffer):
+            self.buffer.extend(bytes(end - len(self.buffer)))
+            self.written.extend(bytes(end - len(self.written)))
+        self.buffer[startaddress:end] = values
+        self.written[startaddress:end] = b'\x01' * len(values)
+        self.starts.setdefault(startaddress, len(self.starts))
+        self._patches = None
+
+    @property
+    def patches(self):
+        # touching and overlapping writes form one patch, keyed by the address of its first byte
+        if self._patches is None:
+            runs = []
+            start = self.written.find(1)
+            while start >= 0:
+                end = self.written.find(0, start)
+                if end < 0:
+                    end = len(self.written)
+                runs.append((self.starts[start], start, end))
+                start = self.written.find(1, end)
+            self._patches = {str(start): list(self.buffer[start:end]) for _, start, end in sorted(runs)}
+        return self._patches
 
     def write_initial_sram(self):
         self.write_bytes(0x183000, self.initial_sram.get_initial_sram())
 
+    def copy(self):
+        ret = copy.copy(self)
+        ret.buffer = self.buffer.copy()
+        ret.written = self.written.copy()
+        ret.starts = dict(self.starts)
+        ret._patches = None
+        ret.initial_sram = copy.deepcopy(self.initial_sram)
+        return ret
+
     def write_to_file(self, file):
         with open(file, 'w') as stream:
             json.dump([self.patches], stream)
@@ -117,6 +136,12 @@ class LocalRom(object):
     def write_initial_sram(self):
         self.write_bytes(0x183000, self.initial_sram.get_initial_sram())
 
+    def copy(self):
+        ret = copy.copy(self)
+        ret.buffer = self.buffer.copy()
+        ret.initial_sram = copy.deepcopy(self.initial_sram)
+        return ret
+
     def write_to_file(self, file):
         with open(file, 'wb') as outfile:
             outfile.write(self.buffer)
@@ -143,16 +168,20 @@ class LocalRom(object):
         if JAP10HASH != basemd5.hexdigest():
             logging.getLogger('').warning('Supplied Base Rom does not match known MD5 for JAP(1.0) release. Will try to patch anyway.')
 
+        # load randomizer patches
+        with open(local_path('data/base2current.bps'), 'rb') as stream:
+            base_patch = stream.read()
+        key = f'{basemd5.hexdigest()} {hashlib.md5(base_patch).hexdigest()}'
+        if key in patched_base_roms:
+            self.buffer = bytearray(patched_base_roms[key])
+            return
+
         orig_buffer = self.buffer.copy()
 
         # extend to 2MB
         self.buffer.extend(bytearray([0x00] * (0x200000 - len(self.buffer))))
 
-        # load randomizer patches
-        with open(local_path('data/base2current.bps'), 'rb') as stream:
-            bps.apply.apply_to_bytearrays(bps.io.read_bps(stream), orig_buffer, self.buffer)
-
-        self.create_json_patch(orig_buffer)
+        bps.apply.apply_to_bytearrays(bps.io.read_bps(io.BytesIO(base_patch)), orig_buffer, self.buffer)
 
         # verify md5
         patchedmd5 = hashlib.md5()
@@ -160,30 +189,30 @@ class LocalRom(object):
         if RANDOMIZERBASEHASH != patchedmd5.hexdigest():
             raise RuntimeError('Provided Base Rom unsuitable for patching. Please provide a JAP(1.0) "Zelda no Densetsu - Kamigami no Triforce (Japan).sfc" rom to use as a base.')
 
+        # base2current.json only depends on the base rom and the patch, it is rewritten when either changes
+        key_path = local_path('data/base2current.json.key')
+        json_path = local_path('data/base2current.json')
+        stale = True
+        if os.path.isfile(json_path) and os.path.isfile(key_path):
+            with open(key_path, 'r') as stream:
+                stale = stream.read() != key
+        if stale:
+            self.create_json_patch(orig_buffer)
+            with open(key_path, 'w') as stream:
+                stream.write(key)
+        patched_base_roms[key] = bytes(self.buffer)
+
     def create_json_patch(self, orig_buffer):
         # extend to 2MB
         orig_buffer.extend(bytearray([0x00] * (len(self.buffer) - len(orig_buffer))))
 
-        i = 0
-        patches = []
-
-        while i < len(self.buffer):
-            if self.buffer[i] == orig_buffer[i]:
-                i += 1
-                continue
-
-            patch_start = i
-            patch_contents = []
-            while self.buffer[i] != orig_buffer[i]:
-                patch_contents.append(self.buffer[i])
-                i += 1
-            patches.append({patch_start: patch_contents})
+        patches = [{start: list(self.buffer[start:end])} for start, end in changed_runs(orig_buffer, self.buffer)]
 
         with open(local_path('data/base2current.json'), 'w') as fp:
             json.dump(patches, fp, separators=(',', ':'))
 
     def write_crc(self):
-        crc = (sum(self.buffer[:0x7FDC] + self.buffer[0x7FE0:]) + 0x01FE) & 0xFFFF
+        crc = (byte_sum(self.buffer) - sum(self.buffer[0x7FDC:0x7FE0]) + 0x01FE) & 0xFFFF
         inv = crc ^ 0xFFFF
         self.write_bytes(0x7FDC, [inv & 0xFF, (inv >> 8) & 0xFF, crc & 0xFF, (crc >> 8) & 0xFF])
 
@@ -586,15 +615,24 @@ def handle_native_dungeon(location, itemid):
 
 
 def patch_rom(world, rom, player, team, enemized, is_mystery=False):
-    random.seed(world.rom_seeds[player])
+    random_state = patch_rom_shared(world, rom, player, enemized, is_mystery)
+    return patch_rom_team(world, rom, player, team, random_state)
+
 
-    # progressive bow silver arrow hint hack
+def distinguish_progressive_bow(world, player):
+    # progressive bow silver arrow hint hack, changes the item code seen by every rom patched after this one
     prog_bow_locs = world.find_items('Progressive Bow', player)
     if len(prog_bow_locs) > 1:
         # only pick a distingushed bow if we have at least two
         distinguished_prog_bow_loc = random.choice(prog_bow_locs)
         distinguished_prog_bow_loc.item.code = 0x65
 
+
+def patch_rom_shared(world, rom, player, enemized, is_mystery=False):
+    # everything that is the same for every team, returns the random state the team part has to start from
+    random.seed(world.rom_seeds[player])
+    distinguish_progressive_bow(world, player)
+
     # patch items
     pot_mw_index = 0
     for location in world.get_locations():
@@ -1546,6 +1584,16 @@ def patch_rom(world, rom, player, team, enemized, is_mystery=False):
             raise Exception('Pot table is too big for current area')
         world.pot_contents[player].write_pot_data_to_rom(rom, colorize_pots)
 
+    try:
+        return random.getstate()
+    except NotImplementedError:
+        return None  # secure random has no state to share
+
+
+def patch_rom_team(world, rom, player, team, random_state):
+    # hints, names and everything derived from them, rom is a copy of one patch_rom_shared made
+    if random_state is not None:
+        random.setstate(random_state)
     write_strings(rom, world, player, team)
 
     # write initial sram
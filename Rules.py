@@ -146,6 +146,7 @@ def item_in_locations(state, item, player, locations):
 
 
 def item_name(state, location, player):
+    state.reads_placement()
     location = state.world.get_location(location, player)
     if location.item is None:
         return None
@@ -1286,6 +1287,7 @@ def standard_rules(world, player):
         return loc.item and loc.item.name in ['Bomb Upgrade (+10)' if world.bombbag[player] else 'Bombs (10)']
 
     def standard_escape_rule(state):
+        state.reads_placement()
         return state.can_kill_most_things(player) or bomb_escape_rule()
 
     add_item_rule(world.get_location('Link\'s Uncle', player), uncle_item_rule)
@@ -4,9 +4,12 @@ import re
 import subprocess
 import sys
 import xml.etree.ElementTree as ET
+import zlib
 from collections import defaultdict
 from math import factorial
 
+import RaceRandom as random
+
 
 def int16_as_bytes(value):
     value = value & 0xFFFF
@@ -18,6 +21,19 @@ def int32_as_bytes(value):
     return [value & 0xFF, (value >> 8) & 0xFF, (value >> 16) & 0xFF, (value >> 24) & 0xFF]
 
 
+def byte_sum(data):
+    # adler32 keeps 1 + the byte sum modulo 65521 in its low half, a 256 byte chunk sums to at most 65280
+    view = memoryview(data)
+    chunks = range(0, len(view), 256)
+    return sum(zlib.adler32(view[i:i + 256]) & 0xFFFF for i in chunks) - len(chunks)
+
+
+def changed_runs(old, new):
+    # (start, end) of every run of bytes that differ between two buffers of the same length
+    changed = (int.from_bytes(old, 'little') ^ int.from_bytes(new, 'little')).to_bytes(len(new), 'little')
+    return [match.span() for match in re.finditer(b'[^\x00]+', changed)]
+
+
 def pc_to_snes(value):
     return ((value << 1) & 0x7F0000) | (value & 0x7FFF) | 0x8000
 
@@ -136,6 +152,33 @@ def ncr(n, r):
     return factorial(n) // factorial(r) // factorial(n-r)
 
 
+# beyond this many indices a permutation is walked lazily instead of shuffling a list of them
+# up to it the list is shuffled exactly as before, so those seeds still reproduce; the lazy walk draws different random
+# numbers, seeds that need it generate differently from 1.1.8 (the version, and so the rom name, was bumped for this)
+shuffled_list_limit = 1 << 22
+
+
+def random_permutation(n):
+    # yields every index in range(n) once, in random order, without holding them all in memory
+    if n <= shuffled_list_limit:
+        sample_list = list(range(0, n))
+        random.shuffle(sample_list)
+        yield from sample_list
+        return
+    # a feistel network is a bijection on a power of 2 range, indices it maps past n are skipped (less than 3/4 of them)
+    half = ((n - 1).bit_length() + 1) // 2
+    mask = (1 << half) - 1
+    keys = [random.getrandbits(half) for _ in range(4)]
+    for i in range(0, 1 << (half * 2)):
+        left, right = i >> half, i & mask
+        for key in keys:
+            mixed = ((right ^ key) * 0x9E3779B1) & 0xFFFFFFFF
+            left, right = right, left ^ ((mixed ^ (mixed >> 15)) & mask)
+        k = (left << half) | right
+        if k < n:
+            yield k
+
+
 entrance_offsets = {
     'Sanctuary': 0x2,
     'HC West': 0x3,
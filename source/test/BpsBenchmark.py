@@ -0,0 +1,90 @@
+import io
+import random
+import sys
+import time
+from contextlib import redirect_stdout
+
+import bps.apply
+import bps.io
+
+from source.tools.BPS import create_bps_from_data, create_bps_delta, create_bps_linear, create_bps_indexed
+
+# usage: python -m source.test.BpsBenchmark [<base rom> <patched rom>]
+#   builds a patch with each encoder, checks it applies back to the patched rom and prints its size and build time.
+#   Without roms a synthetic 1 MB base and 2 MB patched rom are used. The delta encoder compares every candidate
+#   byte by byte, so it is only given the first 64 KB of each.
+
+delta_size = 0x10000
+
+
+def random_bytes(rng, length):
+    # what Random.randbytes (3.9+) returns, written out for older Pythons
+    return rng.getrandbits(length * 8).to_bytes(length, 'little')
+
+
+def synthetic_roms(seed=0):
+    rng = random.Random(seed)
+    original = bytearray()
+    while len(original) < 0x100000:
+        kind = rng.random()
+        length = rng.randint(0x40, 0x2000)
+        if kind < 0.2:
+            original.extend(bytes(length))
+        elif kind < 0.4 and len(original) > length:
+            start = rng.randrange(0, len(original) - length)
+            original.extend(original[start:start + length])
+        else:
+            original.extend(random_bytes(rng, length))
+    del original[0x100000:]
+    modified = bytearray(original) + bytearray(0x100000)
+    # scattered edits, like item and door tables
+    for _ in range(3000):
+        start = rng.randrange(0, len(modified) - 0x40)
+        modified[start:start + rng.randint(1, 0x40)] = random_bytes(rng, rng.randint(1, 0x40))
+    # relocated code and new code in the expanded half
+    offset = 0x100000
+    while offset < 0x1C0000:
+        length = rng.randint(0x100, 0x4000)
+        if rng.random() < 0.5:
+            start = rng.randrange(0, 0x100000 - length)
+            modified[offset:offset + length] = original[start:start + length]
+        else:
+            modified[offset:offset + length] = random_bytes(rng, length)
+        offset += length
+    return bytes(original), bytes(modified[:0x200000])
+
+
+def build(encoder, original, modified):
+    start = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        patch = create_bps_from_data(original, modified, encoder)
+    elapsed = time.perf_counter() - start
+    result = bytearray(len(modified))
+    bps.apply.apply_to_bytearrays(bps.io.read_bps(io.BytesIO(patch.binary_ba)), original, result)
+    if result != modified:
+        raise Exception(f'{encoder.__name__} patch does not recreate the patched rom')
+    return len(patch.binary_ba), elapsed
+
+
+def report(name, encoders, original, modified):
+    print(f'{name}: {len(original):,} -> {len(modified):,} bytes')
+    for encoder in encoders:
+        size, elapsed = build(encoder, original, modified)
+        print(f'  {encoder.__name__:<20}{size:>12,} bytes{elapsed:>10.2f}s')
+
+
+def run_benchmark(argv):
+    if len(argv) >= 2:
+        with open(argv[0], 'rb') as stream:
+            original = stream.read()
+        with open(argv[1], 'rb') as stream:
+            modified = stream.read()
+    else:
+        original, modified = synthetic_roms()
+    report('prefix', [create_bps_delta, create_bps_linear, create_bps_indexed],
+           original[:delta_size], modified[:delta_size])
+    report('full', [create_bps_linear, create_bps_indexed], original, modified)
+
+
+if __name__ == '__main__':
+    run_benchmark(sys.argv[1:])
@@ -0,0 +1,99 @@
+import logging
+import random
+import sys
+import time
+
+import Items
+import MultiServer
+from MultiClient import ReceivedItem, get_location_name_from_address
+
+# usage: python -m source.test.ForfeitBenchmark [players]
+#   builds a synthetic multiworld with every location id the server knows in each player's world, forfeits every
+#   player in turn with the previous duplicate scan and item name scan and with the indexed store and item names,
+#   then times sending one new item to a client by tuplizing the whole history against slicing the kept tuples
+
+
+def synthetic_context(players, seed=0):
+    ctx = MultiServer.Context(None, 0, None)
+    ctx.disable_save = True
+    MultiServer.init_lookups(ctx)
+    rng = random.Random(seed)
+    for player in range(1, players + 1):
+        ctx.player_names[(0, player)] = f'Player {player}'
+        for location in ctx.lookup_id_to_name:
+            ctx.locations[(location, player)] = (rng.randrange(0x01, 0xB0), rng.randint(1, players))
+    return ctx
+
+
+def linear_item_name_from_id(code):
+    # the previous item name lookup, a scan of the item table
+    items = [k for k, i in Items.item_table.items() if type(i[3]) is int and i[3] == code]
+    return items[0] if items else f'Unknown item (ID:{code})'
+
+
+def linear_register_location_checks(ctx, team, slot, locations):
+    # the previous duplicate check, a scan of everything the target player has received
+    for location in locations:
+        if (location, slot) in ctx.locations:
+            target_item, target_player = ctx.locations[(location, slot)]
+            if target_player != slot or slot in ctx.remote_items:
+                found = False
+                recvd_items = MultiServer.get_received_items(ctx, team, target_player)
+                for recvd_item in recvd_items:
+                    if recvd_item.location == location and recvd_item.player == slot:
+                        found = True
+                        break
+                if not found:
+                    new_item = ReceivedItem(target_item, location, slot)
+                    recvd_items.append(new_item)
+                    if slot != target_player:
+                        MultiServer.broadcast_team(ctx, team, [['ItemSent', (slot, location, target_player, target_item)]])
+                        loc_name = get_location_name_from_address(ctx, location)
+                    logging.info('(Team #%d) %s sent %s to %s (%s)' % (team+1, ctx.player_names[(team, slot)], linear_item_name_from_id(target_item), ctx.player_names[(team, target_player)], loc_name))
+    MultiServer.send_new_items(ctx)
+
+
+def forfeit_all(ctx, register, players):
+    all_locations = set(ctx.lookup_id_to_name.keys())
+    timings = []
+    for slot in range(1, players + 1):
+        start = time.perf_counter()
+        register(ctx, 0, slot, all_locations)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def received(ctx):
+    return {key: MultiServer.tuplize_received_items(items) for key, items in ctx.received_items.items()}
+
+
+def run_benchmark(players=50):
+    old_ctx = synthetic_context(players)
+    new_ctx = synthetic_context(players)
+    old_timings = forfeit_all(old_ctx, linear_register_location_checks, players)
+    new_timings = forfeit_all(new_ctx, MultiServer.register_location_checks, players)
+    if received(old_ctx) != received(new_ctx):
+        raise Exception('Indexed store received different items')
+    total = sum(len(items) for items in new_ctx.received_items.values())
+    print(f'{players} players, {len(new_ctx.lookup_id_to_name)} locations each, {total} items received')
+    print(f'forfeit every player: previous {sum(old_timings):.2f}s (slowest {max(old_timings) * 1000:.1f}ms), '
+          f'indexed {sum(new_timings):.2f}s (slowest {max(new_timings) * 1000:.1f}ms)')
+
+    (team, player), items = max(new_ctx.received_items.items(), key=lambda entry: len(entry[1]))
+    tuples = MultiServer.get_received_item_tuples(new_ctx, team, player)
+    sends = 1000
+    start = time.perf_counter()
+    for _ in range(sends):
+        MultiServer.tuplize_received_items(items)[len(items) - 1:]
+    old_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(sends):
+        tuples[len(tuples) - 1:]
+    new_time = time.perf_counter() - start
+    print(f'send one new item of {len(items)}: tuplize history {old_time / sends * 1e6:.1f}us, '
+          f'kept tuples {new_time / sends * 1e6:.2f}us')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(message)s', level=logging.WARNING)
+    run_benchmark(*[int(arg) for arg in sys.argv[1:2]])
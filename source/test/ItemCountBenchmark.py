@@ -0,0 +1,88 @@
+import logging
+import sys
+import time
+from collections import Counter
+
+from BaseClasses import CollectionState
+from CLI import parse_cli
+from Main import main
+from source.classes.BabelFish import BabelFish
+
+# usage: python -m source.test.ItemCountBenchmark --door_shuffle crossed --keysanity --seed 11 --rom <rom>
+#   generates one seed, then evaluates every access rule against a fully collected state and copies that state,
+#   once with item counts in a Counter keyed by (name, player) and once with the per-player id arrays
+
+
+class CounterState(CollectionState):
+    # the previous representation of prog_items
+    def has(self, item, player, count=1):
+        if count == 1:
+            return (item, player) in self.prog_items
+        return self.prog_items[item, player] >= count
+
+    def has_sm_key(self, item, player, count=1):
+        if self.world.retro[player]:
+            return super().has_sm_key(item, player, count)
+        if count == 1:
+            return (item, player) in self.prog_items
+        return self.prog_items[item, player] >= count
+
+    def item_count(self, item, player):
+        return self.prog_items[item, player]
+
+    def bottle_count(self, player):
+        return len([item for (item, itemplayer) in self.prog_items if item.startswith('Bottle') and itemplayer == player])
+
+
+def as_counter_state(state):
+    ret = state.copy()
+    ret.__class__ = CounterState
+    ret.prog_items = Counter(dict(state.prog_items.items()))
+    return ret
+
+
+def time_rules(state, spots, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        results = [spot.access_rule(state) for spot in spots]
+    return time.perf_counter() - start, results
+
+
+def time_copies(state, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        state.prog_items.copy()
+    return time.perf_counter() - start
+
+
+def run_benchmark(argv, repeats=200):
+    args = parse_cli(argv)
+    args.suppress_rom = True
+    args.create_spoiler = False
+    args.skip_playthrough = True
+    world = main(args, seed=args.seed, fish=BabelFish(lang='en'))
+
+    state = world.get_all_state(keys=True)
+    for player in range(1, world.players + 1):
+        state.update_reachable_regions(player)
+    counter_state = as_counter_state(state)
+    spots = [spot for region in world.regions for spot in region.exits + region.locations]
+
+    counter_time, counter_results = time_rules(counter_state, spots, repeats)
+    array_time, array_results = time_rules(state, spots, repeats)
+    if counter_results != array_results:
+        raise Exception('Item id arrays disagreed with the Counter')
+    evaluations = len(spots) * repeats
+    print(f'{len(spots)} access rules, {repeats} passes')
+    print(f'Counter rules:  {evaluations / counter_time:,.0f} evaluations/s')
+    print(f'Id array rules: {evaluations / array_time:,.0f} evaluations/s ({counter_time / array_time:.2f}x)')
+
+    counter_copy = time_copies(counter_state, repeats * 50)
+    array_copy = time_copies(state, repeats * 50)
+    print(f'Counter copy:  {counter_copy / (repeats * 50) * 1e6:.2f}us')
+    print(f'Id array copy: {array_copy / (repeats * 50) * 1e6:.2f}us ({counter_copy / array_copy:.2f}x)')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(message)s', level=logging.WARNING)
+    run_benchmark(sys.argv[1:])
@@ -0,0 +1,75 @@
+import logging
+import resource
+import sys
+import time
+import tracemalloc
+from itertools import islice
+
+import DoorShuffle
+import RaceRandom as random
+from CLI import parse_cli
+from Main import main
+from Utils import ncr, random_permutation
+from source.classes.BabelFish import BabelFish
+
+# usage: python -m source.test.KeyDoorSamplerBenchmark --door_shuffle crossed --intensity 3 --keysanity --seed 67 --rom <rom>
+#   generates one seed recording how many key door combinations each dungeon had to sample from, then compares the
+#   memory needed to draw from those (and from a crossed GT sized builder) with a shuffled list and the lazy sampler
+
+# a crossed GT with many key door candidates
+gt_candidates, gt_key_doors = 40, 12
+# lists longer than this are not built, an index list needs at least 8 bytes per entry for the pointers alone
+list_limit = 1 << 22
+
+
+def shuffled_list(n):
+    # the previous behaviour
+    sample_list = list(range(0, n))
+    random.shuffle(sample_list)
+    return iter(sample_list)
+
+
+def measure(sampler, n, draws):
+    tracemalloc.start()
+    start = time.perf_counter()
+    drawn = list(islice(sampler(n), draws))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, elapsed, len(drawn)
+
+
+def run_benchmark(argv, draws=1000):
+    args = parse_cli(argv)
+    args.suppress_rom = True
+    args.create_spoiler = False
+    args.skip_playthrough = True
+
+    sampled = []
+
+    def recording_permutation(n):
+        sampled.append(n)
+        return random_permutation(n)
+    DoorShuffle.random_permutation = recording_permutation
+    try:
+        main(args, seed=args.seed, fish=BabelFish(lang='en'))
+    finally:
+        DoorShuffle.random_permutation = random_permutation
+
+    sizes = sorted(set(sampled), reverse=True)[:5] + [ncr(gt_candidates, gt_key_doors)]
+    print(f'{len(sampled)} key door samplers, largest {max(sampled, default=0):,} combinations')
+    for n in sizes:
+        lazy_peak, lazy_time, lazy_drawn = measure(random_permutation, n, draws)
+        if n <= list_limit:
+            list_peak, list_time, _ = measure(shuffled_list, n, draws)
+            old = f'{list_peak / 1024:,.0f} KiB in {list_time * 1000:.1f}ms'
+        else:
+            old = f'not built, at least {n * 8 / (1 << 30):,.1f} GiB'
+        print(f'{n:>14,} combinations: list {old}, lazy {lazy_peak / 1024:,.0f} KiB in {lazy_time * 1000:.1f}ms'
+              f' for {lazy_drawn} draws')
+    print(f'Peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:,.0f} MiB')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(message)s', level=logging.WARNING)
+    run_benchmark(sys.argv[1:])
@@ -0,0 +1,58 @@
+import asyncio
+import json
+import logging
+import sys
+import time
+
+import Items
+import MultiServer
+from source.test.ForfeitBenchmark import synthetic_context
+
+# usage: python -m source.test.LocationScoutBenchmark [trackers]
+#   times a tracker scouting every location position on connect, repeated for [trackers] clients, with the previous
+#   per location list copy and item table scan against the tables init_lookups builds
+
+
+def previous_scouts(ctx, slot, locations):
+    # the previous lookups, a copy of the location ids and a scan of the item table for every location
+    replacements = {'SmallKey': 0xA2, 'BigKey': 0x9D, 'Compass': 0x8D, 'Map': 0x7D}
+    locs = []
+    for location in locations:
+        location_id, loc_name = list(ctx.lookup_id_to_name.items())[location - 1]
+        target_item, target_player = ctx.locations[(location_id, slot)]
+        item_type = [i[2] for i in Items.item_table.values() if type(i[3]) is int and i[3] == target_item]
+        if item_type:
+            target_item = replacements.get(item_type[0], target_item)
+        locs.append([loc_name, location, target_item, target_player])
+    return [['LocationInfo', [l[1:] for l in locs]]]
+
+
+async def table_scouts(ctx, client, locations):
+    await MultiServer.process_client_cmd(ctx, client, 'LocationScouts', locations)
+    return json.loads(client.send_queue.get_nowait())
+
+
+def run_benchmark(trackers=10):
+    ctx = synthetic_context(1)
+    client = MultiServer.Client(None)
+    client.auth, client.team, client.slot, client.name = True, 0, 1, 'Tracker'
+    locations = list(range(1, len(ctx.lookup_scout_locations) + 1))
+
+    start = time.perf_counter()
+    for _ in range(trackers):
+        old_reply = previous_scouts(ctx, client.slot, locations)
+    old_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(trackers):
+        new_reply = asyncio.run(table_scouts(ctx, client, locations))
+    new_time = time.perf_counter() - start
+    if json.loads(json.dumps(old_reply)) != new_reply:
+        raise Exception('Scout tables gave a different reply')
+    print(f'{trackers} trackers scouting {len(locations)} locations: '
+          f'previous {old_time / trackers * 1000:.1f}ms, tables {new_time / trackers * 1000:.1f}ms per tracker '
+          f'({old_time / new_time:.0f}x)')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(message)s', level=logging.WARNING)
+    run_benchmark(*[int(arg) for arg in sys.argv[1:2]])
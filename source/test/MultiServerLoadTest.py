@@ -0,0 +1,228 @@
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import websockets
+
+import Items
+import MultiServer
+
+# usage: python -m source.test.MultiServerLoadTest --players 40 --locations 200 --rate 2 --duration 20
+#   builds a synthetic multiworld, runs the server on its own thread and event loop on localhost and connects one
+#   simulated client per player. Each client connects, streams LocationChecks at --rate per second, and every so
+#   often sends a Sync, scouts a few locations and says something. Reports round trip latency per message type,
+#   the CPU time of the server thread and the time spent writing the journal and save file.
+
+
+def rom_name(player):
+    return list(f'LOADTEST{player:04}'.encode('utf-8')) + [0] * 9
+
+
+def synthetic_context(players, locations, save_filename, seed=0):
+    ctx = MultiServer.Context('127.0.0.1', 0, None)
+    MultiServer.init_lookups(ctx)
+    ctx.save_filename = save_filename
+    ctx.journal_filename = save_filename + '.journal'
+    rng = random.Random(seed)
+    item_codes = sorted({data[3] for data in Items.item_table.values() if type(data[3]) is int})
+    location_ids = [location_id for location_id, _ in ctx.lookup_scout_locations[:locations]]
+    for player in range(1, players + 1):
+        ctx.player_names[(0, player)] = f'Player{player}'
+        ctx.rom_names[tuple(rom_name(player))] = (0, player)
+        for location_id in location_ids:
+            ctx.locations[(location_id, player)] = (rng.choice(item_codes), rng.randint(1, players))
+    MultiServer.start_journal(ctx.journal_filename, list(ctx.rom_names.items()))
+    return ctx, location_ids
+
+
+def timed(stats, name, func):
+    # the journal writer looks these up when it runs them, so wrapping the module attribute times every write
+    def wrapper(*args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            stats[name].append(time.perf_counter() - start)
+    return wrapper
+
+
+class ServerThread(threading.Thread):
+    def __init__(self, ctx):
+        super().__init__(daemon=True)
+        self.ctx = ctx
+        self.ready = threading.Event()
+        self.loop = None
+        self.stop_event = None
+        self.cpu = 0
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(self.serve())
+        self.loop.close()
+
+    async def serve(self):
+        self.stop_event = asyncio.Event()
+        handler = lambda websocket, path=None: MultiServer.server(websocket, path, self.ctx)
+        async with websockets.serve(handler, '127.0.0.1', 0, ping_interval=None, ping_timeout=None, max_size=None) as server:
+            self.ctx.port = next(iter(server.sockets)).getsockname()[1]
+            start = time.thread_time()
+            self.ready.set()
+            await self.stop_event.wait()
+            if self.ctx.journal_task:
+                await self.ctx.journal_task
+            self.cpu = time.thread_time() - start
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.stop_event.set)
+        self.join()
+
+
+class SimulatedClient(object):
+    def __init__(self, player, locations, args, latencies, sent_at):
+        self.player = player
+        self.locations = locations
+        self.args = args
+        self.latencies = latencies
+        # (location, sender) -> send time, shared so the receiving client can time the delivery
+        self.sent_at = sent_at
+        self.scouts = []
+        self.syncs = []
+        self.says = {}
+        self.delivered = set()
+        self.received = 0
+        self.messages = 0
+        self.refused = 0
+
+    async def run(self, uri, ctx, end):
+        rng = random.Random(self.player)
+        async with websockets.connect(uri, ping_interval=None, ping_timeout=None, max_size=None, close_timeout=1) as socket:
+            connect_start = time.perf_counter()
+            await socket.send(json.dumps([['Connect', {'password': None, 'rom': rom_name(self.player)}]]))
+            receiver = asyncio.create_task(self.receive(socket, connect_start))
+            for count, (location, target_player) in enumerate(self.locations, 1):
+                if time.perf_counter() >= end:
+                    break
+                now = time.perf_counter()
+                self.sent_at[(location, self.player)] = now
+                await socket.send(json.dumps([['LocationChecks', [location]]]))
+                if self.args.sync_every and count % self.args.sync_every == 0 and self.received:
+                    self.syncs.append(time.perf_counter())
+                    await socket.send(json.dumps([['Sync']]))
+                if self.args.scout_every and count % self.args.scout_every == 0:
+                    self.scouts.append(time.perf_counter())
+                    positions = rng.sample(range(1, self.args.locations + 1), min(10, self.args.locations))
+                    await socket.send(json.dumps([['LocationScouts', positions]]))
+                if self.args.say_every and count % self.args.say_every == 0:
+                    text = f'load test {self.player} {count}'
+                    self.says[f'Player{self.player}: {text}'] = time.perf_counter()
+                    await socket.send(json.dumps([['Say', text]]))
+                await asyncio.sleep(max(0.0, now + 1 / self.args.rate - time.perf_counter()))
+            await asyncio.sleep(self.args.grace)
+            receiver.cancel()
+
+    async def receive(self, socket, connect_start):
+        async for data in socket:
+            now = time.perf_counter()
+            for msg in json.loads(data):
+                cmd, *args = msg
+                payload = args[0] if args else None
+                self.messages += 1
+                if cmd == 'Connected':
+                    self.latencies['connect'].append(now - connect_start)
+                elif cmd == 'ItemSent':
+                    sender, location, _, _ = payload
+                    if sender == self.player and (location, sender) in self.sent_at:
+                        self.latencies['check'].append(now - self.sent_at[(location, sender)])
+                elif cmd == 'ReceivedItems':
+                    index, items = payload
+                    if index == 0 and self.syncs:
+                        self.latencies['sync'].append(now - self.syncs.pop(0))
+                    for _, location, sender in items:
+                        if (location, sender) in self.sent_at and (location, sender) not in self.delivered:
+                            self.delivered.add((location, sender))
+                            self.latencies['delivery'].append(now - self.sent_at[(location, sender)])
+                    self.received += len(items)
+                elif cmd == 'LocationInfo' and self.scouts:
+                    self.latencies['scout'].append(now - self.scouts.pop(0))
+                elif cmd == 'Print' and payload in self.says:
+                    self.latencies['say'].append(now - self.says.pop(payload))
+                elif cmd in ['InvalidCmd', 'InvalidArguments', 'ConnectionRefused']:
+                    self.refused += 1
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run_clients(ctx, location_ids, args):
+    latencies = defaultdict(list)
+    sent_at = {}
+    clients = []
+    for player in range(1, args.players + 1):
+        locations = [(location_id, ctx.locations[(location_id, player)][1]) for location_id in location_ids]
+        clients.append(SimulatedClient(player, locations, args, latencies, sent_at))
+    uri = f'ws://127.0.0.1:{ctx.port}'
+    start = time.perf_counter()
+    end = start + args.duration
+    await asyncio.gather(*[client.run(uri, ctx, end) for client in clients])
+    return latencies, clients, time.perf_counter() - start
+
+
+def run_load_test(argv):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', default=40, type=int)
+    parser.add_argument('--locations', default=200, type=int, help='locations checked by each player')
+    parser.add_argument('--rate', default=2.0, type=float, help='location checks per second per client')
+    parser.add_argument('--duration', default=20.0, type=float, help='seconds each client keeps checking')
+    parser.add_argument('--grace', default=2.0, type=float, help='seconds to wait for replies after the last check')
+    parser.add_argument('--sync_every', default=10, type=int, help='checks between Syncs, 0 for none')
+    parser.add_argument('--scout_every', default=20, type=int, help='checks between LocationScouts, 0 for none')
+    parser.add_argument('--say_every', default=30, type=int, help='checks between Says, 0 for none')
+    parser.add_argument('--loglevel', default='warning', choices=['debug', 'info', 'warning', 'error', 'critical'])
+    args = parser.parse_args(argv)
+    logging.basicConfig(format='%(message)s', level=getattr(logging, args.loglevel.upper()))
+
+    io_times = defaultdict(list)
+    write_journal, write_save_file = MultiServer.write_journal, MultiServer.write_save_file
+    MultiServer.write_journal = timed(io_times, 'journal', write_journal)
+    MultiServer.write_save_file = timed(io_times, 'save file', write_save_file)
+    try:
+        with tempfile.TemporaryDirectory() as save_dir:
+            ctx, location_ids = synthetic_context(args.players, args.locations, f'{save_dir}/loadtest_multisave')
+            server = ServerThread(ctx)
+            server.start()
+            server.ready.wait()
+            try:
+                latencies, clients, elapsed = asyncio.run(run_clients(ctx, location_ids, args))
+            finally:
+                server.stop()
+    finally:
+        MultiServer.write_journal, MultiServer.write_save_file = write_journal, write_save_file
+
+    received = sum(len(items) for items in ctx.received_items.values())
+    messages = sum(client.messages for client in clients)
+    print(f'{args.players} clients for {elapsed:.1f}s: {received} items received, {messages} server messages '
+          f'({messages / elapsed:,.0f}/s)')
+    print(f'  {"latency":<12}{"count":>8}{"p50 ms":>10}{"p99 ms":>10}{"max ms":>10}')
+    for name in ['connect', 'check', 'delivery', 'sync', 'scout', 'say']:
+        values = latencies[name]
+        if values:
+            print(f'  {name:<12}{len(values):>8}{percentile(values, 50) * 1000:>10.1f}'
+                  f'{percentile(values, 99) * 1000:>10.1f}{max(values) * 1000:>10.1f}')
+    print(f'server thread CPU: {server.cpu:.2f}s ({100 * server.cpu / elapsed:.0f}% of the run)')
+    for name, values in io_times.items():
+        print(f'{name} writes: {len(values)}, {sum(values) * 1000:.1f}ms total, {max(values) * 1000:.1f}ms max')
+    print(f'send queue peak: {ctx.send_queue_peak}, clients dropped: {ctx.dropped_clients}')
+    print(f'commands refused: {sum(client.refused for client in clients)}')
+
+
+if __name__ == '__main__':
+    run_load_test(sys.argv[1:])
@@ -0,0 +1,83 @@
+import logging
+import sys
+import time
+from collections import defaultdict
+
+import DungeonGenerator
+from CLI import parse_cli
+from Main import main
+from source.classes.BabelFish import BabelFish
+
+# usage: python -m source.test.ProposalSearchBenchmark --door_shuffle crossed --seed 1 --count 10 --rom <rom>
+#   generates --count consecutive seeds once with the fixed restart schedule (1000 choices, 10 attempts) and once with
+#   the geometric one, then prints the distribution of choices made per dungeon layout search
+
+schedules = {
+    'fixed': (1000, 1, 10000),
+    'geometric': (DungeonGenerator.restart_cutoff, DungeonGenerator.restart_growth,
+                  DungeonGenerator.proposal_iteration_budget),
+}
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_schedule(argv, seeds, schedule):
+    DungeonGenerator.restart_cutoff, DungeonGenerator.restart_growth, DungeonGenerator.proposal_iteration_budget = schedule
+    find_proposal = DungeonGenerator.generate_dungeon_find_proposal
+    searches = defaultdict(list)
+    failures = 0
+
+    def recording_find_proposal(builder, *args):
+        itr, restarts = builder.proposal_itr, builder.proposal_restarts
+        try:
+            return find_proposal(builder, *args)
+        finally:
+            searches[builder.name].append((builder.proposal_itr - itr, builder.proposal_restarts - restarts))
+
+    DungeonGenerator.generate_dungeon_find_proposal = recording_find_proposal
+    start = time.perf_counter()
+    try:
+        for seed in seeds:
+            args = parse_cli(argv)
+            args.suppress_rom = True
+            args.create_spoiler = False
+            args.skip_playthrough = True
+            try:
+                main(args, seed=seed, fish=BabelFish(lang='en'))
+            except Exception as e:
+                failures += 1
+                logging.getLogger('').warning('Seed %s failed: %s', seed, e)
+    finally:
+        DungeonGenerator.generate_dungeon_find_proposal = find_proposal
+    return searches, failures, time.perf_counter() - start
+
+
+def run_benchmark(argv):
+    args = parse_cli(argv)
+    seeds = [args.seed + i for i in range(max(args.count, 1))]
+    default = (DungeonGenerator.restart_cutoff, DungeonGenerator.restart_growth,
+               DungeonGenerator.proposal_iteration_budget)
+    try:
+        for name, schedule in schedules.items():
+            searches, failures, elapsed = run_schedule(argv, seeds, schedule)
+            print(f'{name}: {len(seeds)} seeds in {elapsed:.1f}s, {failures} failed')
+            print(f'  {"dungeon":<24}{"searches":>9}{"median":>8}{"p90":>8}{"max":>8}{"restarts":>10}')
+            for dungeon, results in sorted(searches.items()):
+                iterations = [itr for itr, _ in results]
+                restarts = sum(r for _, r in results)
+                print(f'  {dungeon:<24}{len(results):>9}{percentile(iterations, 50):>8}'
+                      f'{percentile(iterations, 90):>8}{max(iterations):>8}{restarts:>10}')
+            everything = [itr for results in searches.values() for itr, _ in results]
+            print(f'  {"all":<24}{len(everything):>9}{percentile(everything, 50):>8}'
+                  f'{percentile(everything, 90):>8}{max(everything):>8}')
+    finally:
+        DungeonGenerator.restart_cutoff, DungeonGenerator.restart_growth, \
+            DungeonGenerator.proposal_iteration_budget = default
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(message)s', level=logging.WARNING)
+    run_benchmark(sys.argv[1:])
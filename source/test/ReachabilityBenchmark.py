@@ -0,0 +1,61 @@
+import logging
+import sys
+import time
+
+from BaseClasses import CollectionState
+from CLI import parse_cli
+from Main import main, create_playthrough
+from source.classes.BabelFish import BabelFish
+
+# usage: python -m source.test.ReachabilityBenchmark --door_shuffle crossed --keysanity --seed 11 --rom <rom>
+#   generates one seed, then recalculates the playthrough with the full event re-sweep and with the incremental one
+
+
+def full_sweep_for_events_once(self, player):
+    # the previous implementation: every filled location is re-tested on every pass
+    locations = self.world.get_filled_locations(player)
+    checked_locations = set([l for l in locations if l in self.locations_checked])
+    reachable_events = [location for location in locations if location.event and location.can_reach(self)]
+    reachable_events = self._do_not_flood_the_keys(reachable_events)
+    for event in reachable_events:
+        if event not in checked_locations:
+            self.events.append((event.name, event.player))
+            self.collect(event.item, True, event)
+    return len(reachable_events) > len(checked_locations)
+
+
+def time_sweep(world, sweep, repeats):
+    CollectionState.sweep_for_events_once = sweep
+    timings, results = [], []
+    for _ in range(repeats):
+        world.clear_exp_cache()
+        start = time.perf_counter()
+        create_playthrough(world)
+        timings.append(time.perf_counter() - start)
+        results.append(world.spoiler.playthrough)
+    return min(timings), results
+
+
+def run_benchmark(argv, repeats=3):
+    args = parse_cli(argv)
+    args.suppress_rom = True
+    args.create_spoiler = False
+    args.skip_playthrough = True
+    world = main(args, seed=args.seed, fish=BabelFish(lang='en'))
+
+    incremental_sweep = CollectionState.sweep_for_events_once
+    try:
+        full_time, full_results = time_sweep(world, full_sweep_for_events_once, repeats)
+        incr_time, incr_results = time_sweep(world, incremental_sweep, repeats)
+    finally:
+        CollectionState.sweep_for_events_once = incremental_sweep
+
+    if full_results != incr_results:
+        raise Exception('Incremental event sweep disagreed with the full sweep')
+    print(f'Full sweep:        {full_time:.3f}s')
+    print(f'Incremental sweep: {incr_time:.3f}s ({full_time / incr_time:.2f}x)')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(message)s', level=logging.WARNING)
+    run_benchmark(sys.argv[1:])
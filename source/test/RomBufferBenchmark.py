@@ -0,0 +1,139 @@
+import bisect
+import json
+import os
+import random
+import sys
+import time
+
+from Rom import JsonRom
+from Utils import byte_sum, changed_runs
+
+# usage: python -m source.test.RomBufferBenchmark [repeats]
+#   times the base2current.json diff and the rom checksum on a synthetic 1 MB base and 2 MB patched rom,
+#   the previous byte at a time versions against the ones LocalRom uses now, then builds json patches from
+#   scattered small writes with the previous sorted address list and the JsonRom overlay
+
+
+def old_json_patch(buffer, orig_buffer):
+    i = 0
+    patches = []
+    while i < len(buffer):
+        if buffer[i] == orig_buffer[i]:
+            i += 1
+            continue
+        patch_start = i
+        patch_contents = []
+        while buffer[i] != orig_buffer[i]:
+            patch_contents.append(buffer[i])
+            i += 1
+        patches.append({patch_start: patch_contents})
+    return patches
+
+
+def new_json_patch(buffer, orig_buffer):
+    return [{start: list(buffer[start:end])} for start, end in changed_runs(orig_buffer, buffer)]
+
+
+def old_crc(buffer):
+    return (sum(buffer[:0x7FDC] + buffer[0x7FE0:]) + 0x01FE) & 0xFFFF
+
+
+def new_crc(buffer):
+    return (byte_sum(buffer) - sum(buffer[0x7FDC:0x7FE0]) + 0x01FE) & 0xFFFF
+
+
+class SortedListJsonRom(object):
+    # the previous JsonRom, patches merged in place and located through a sorted list of start addresses
+    def __init__(self):
+        self.patches = {}
+        self.addresses = []
+
+    def write_bytes(self, startaddress, values):
+        if not values:
+            return
+        values = list(values)
+
+        pos = bisect.bisect_right(self.addresses, startaddress)
+        intervalstart = self.addresses[pos-1] if pos else None
+        intervalpatch = self.patches[str(intervalstart)] if pos else None
+
+        if pos and startaddress <= intervalstart + len(intervalpatch):
+            offset = startaddress - intervalstart
+            intervalpatch[offset:offset+len(values)] = values
+            startaddress = intervalstart
+            values = intervalpatch
+        else:
+            self.addresses.insert(pos, startaddress)
+            self.patches[str(startaddress)] = values
+            pos = pos + 1
+
+        while pos < len(self.addresses) and self.addresses[pos] <= startaddress + len(values):
+            intervalstart = self.addresses[pos]
+            values.extend(self.patches[str(intervalstart)][startaddress+len(values)-intervalstart:])
+            del self.patches[str(intervalstart)]
+            del self.addresses[pos]
+
+
+def json_rom_patches(rom_class, writes):
+    rom = rom_class()
+    for address, values in writes:
+        rom.write_bytes(address, values)
+    return json.dumps([rom.patches])
+
+
+def synthetic_roms():
+    orig_buffer = bytearray(os.urandom(0x100000))
+    buffer = orig_buffer + bytearray(os.urandom(0x100000))
+    # scattered patches of a few bytes to a few kilobytes, like the base patch
+    for start in range(0x300, 0x100000, 0x1F3F):
+        length = 1 + (start * 7) % 0x600
+        buffer[start:start + length] = bytes((b + 1) & 0xFF for b in buffer[start:start + length])
+    orig_buffer.extend(bytearray([0x00] * (len(buffer) - len(orig_buffer))))
+    buffer[-1] = orig_buffer[-1]
+    return buffer, orig_buffer
+
+
+def random_bytes(rng, length):
+    # what Random.randbytes (3.9+) returns, written out for older Pythons
+    return rng.getrandbits(length * 8).to_bytes(length, 'little')
+
+
+def best_time(func, repeats, *args):
+    timings, result = [], None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def run_benchmark(repeats=5):
+    buffer, orig_buffer = synthetic_roms()
+    old_time, old_patches = best_time(old_json_patch, repeats, buffer, orig_buffer)
+    new_time, new_patches = best_time(new_json_patch, repeats, buffer, orig_buffer)
+    if old_patches != new_patches:
+        raise Exception('Json patches differ')
+    print(f'json patch ({len(new_patches)} runs): byte loop {old_time * 1000:.1f}ms, '
+          f'xor scan {new_time * 1000:.1f}ms ({old_time / new_time:.1f}x)')
+
+    rom = buffer + bytearray(0x200000)
+    old_time, old_result = best_time(old_crc, repeats * 4, rom)
+    new_time, new_result = best_time(new_crc, repeats * 4, rom)
+    if old_result != new_result:
+        raise Exception('Checksums differ')
+    print(f'crc (4 MB): sum of slices {old_time * 1000:.1f}ms, '
+          f'adler32 chunks {new_time * 1000:.1f}ms ({old_time / new_time:.1f}x)')
+
+    rng = random.Random(0)
+    for count in (5000, 50000, 200000):
+        writes = [(rng.randrange(0x400000), random_bytes(rng, rng.randint(1, 8))) for _ in range(count)]
+        old_time, old_json = best_time(json_rom_patches, 1, SortedListJsonRom, writes)
+        new_time, new_json = best_time(json_rom_patches, 1, JsonRom, writes)
+        if old_json != new_json:
+            raise Exception('Json rom patches differ')
+        print(f'json rom ({count} writes): sorted list {old_time * 1000:.1f}ms, '
+              f'overlay {new_time * 1000:.1f}ms ({old_time / new_time:.1f}x)')
+
+
+if __name__ == '__main__':
+    run_benchmark(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,60 @@
+import logging
+import sys
+import time
+
+import BaseClasses
+import Main
+from BaseClasses import SphereIterator
+from CLI import parse_cli
+from Main import main, create_playthrough
+from source.classes.BabelFish import BabelFish
+
+# usage: python -m source.test.SphereBenchmark --door_shuffle crossed --keysanity --seed 11 --rom <rom>
+#   generates one seed, then recalculates the playthrough rescanning every candidate on each sphere
+#   and with the incremental sphere iterator
+
+
+class RescanSpheres(SphereIterator):
+    # the previous behaviour: every remaining candidate is tested again on every sphere
+    def next_sphere(self):
+        sphere = [location for location in self.remaining
+                  if location.can_reach(self.state) and self.state.not_flooding_a_key(self.state.world, location)]
+        for location in sphere:
+            del self.remaining[location]
+        return sphere
+
+
+def time_playthrough(world, iterator, repeats):
+    BaseClasses.SphereIterator = Main.SphereIterator = iterator
+    timings, results = [], []
+    for _ in range(repeats):
+        world.clear_exp_cache()
+        start = time.perf_counter()
+        create_playthrough(world)
+        timings.append(time.perf_counter() - start)
+        results.append(world.spoiler.playthrough)
+    return min(timings), results
+
+
+def run_benchmark(argv, repeats=3):
+    args = parse_cli(argv)
+    args.suppress_rom = True
+    args.create_spoiler = False
+    args.skip_playthrough = True
+    world = main(args, seed=args.seed, fish=BabelFish(lang='en'))
+
+    try:
+        rescan_time, rescan_results = time_playthrough(world, RescanSpheres, repeats)
+        incr_time, incr_results = time_playthrough(world, SphereIterator, repeats)
+    finally:
+        BaseClasses.SphereIterator = Main.SphereIterator = SphereIterator
+
+    if rescan_results != incr_results:
+        raise Exception('Incremental spheres disagreed with the full rescan')
+    print(f'Full rescan:         {rescan_time:.3f}s')
+    print(f'Incremental spheres: {incr_time:.3f}s ({rescan_time / incr_time:.2f}x)')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(message)s', level=logging.WARNING)
+    run_benchmark(sys.argv[1:])
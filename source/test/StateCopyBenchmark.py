@@ -0,0 +1,83 @@
+import copy
+import logging
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+from BaseClasses import CollectionState
+from CLI import parse_cli
+from Main import main
+from source.classes.BabelFish import BabelFish
+
+# usage: python -m source.test.StateCopyBenchmark --multi 8 --seed 1 --rom <rom>
+#   generates one multiworld, then copies a fully explored state the way fill and key logic do:
+#   copy it, touch one player's reachability and throw the copy away
+
+
+def eager_copy(self):
+    # the previous implementation: every player's containers are cloned up front
+    ret = CollectionState(self.world, skip_init=True)
+    ret.prog_items = self.prog_items.copy()
+    ret.reachable_regions = {player: copy.copy(self.reachable_regions[player]) for player in range(1, self.world.players + 1)}
+    ret.blocked_connections = {player: copy.copy(self.blocked_connections[player]) for player in range(1, self.world.players + 1)}
+    ret.events = copy.copy(self.events)
+    ret.path = copy.copy(self.path)
+    ret.locations_checked = copy.copy(self.locations_checked)
+    ret.stale = {player: self.stale[player] for player in range(1, self.world.players + 1)}
+    ret.door_counter = {player: (copy.copy(self.door_counter[player][0]), copy.copy(self.door_counter[player][1]))
+                        for player in range(1, self.world.players + 1)}
+    ret.reached_doors = {player: copy.copy(self.reached_doors[player]) for player in range(1, self.world.players + 1)}
+    ret.opened_doors = {player: copy.copy(self.opened_doors[player]) for player in range(1, self.world.players + 1)}
+    ret.dungeons_to_check = {
+        player: defaultdict(dict, {name: copy.copy(checklist)
+                                   for name, checklist in self.dungeons_to_check[player].items()})
+        for player in range(1, self.world.players + 1)}
+    return ret
+
+
+def copy_churn(state, copier, count):
+    players = state.world.players
+    kept = []
+    for i in range(count):
+        child = copier(state)
+        player = i % players + 1
+        child.reachable_regions[player][None] = None
+        child.opened_doors[player].add(None)
+        kept.append(child)
+    return kept
+
+
+def measure(state, copier, count):
+    start = time.perf_counter()
+    copy_churn(state, copier, count)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    kept = copy_churn(state, copier, count)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return elapsed, peak
+
+
+def run_benchmark(argv, count=2000):
+    args = parse_cli(argv)
+    args.suppress_rom = True
+    args.create_spoiler = False
+    args.skip_playthrough = True
+    world = main(args, seed=args.seed, fish=BabelFish(lang='en'))
+
+    state = world.get_all_state(keys=True)
+    for player in range(1, world.players + 1):
+        state.update_reachable_regions(player)
+
+    eager_time, eager_peak = measure(state, eager_copy, count)
+    lazy_time, lazy_peak = measure(state, CollectionState.copy, count)
+    print(f'{world.players} player(s), {count} copies')
+    print(f'Eager copy: {eager_time:.3f}s, peak {eager_peak / 2**20:.1f} MiB')
+    print(f'Lazy copy:  {lazy_time:.3f}s, peak {lazy_peak / 2**20:.1f} MiB')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(format='%(message)s', level=logging.WARNING)
+    run_benchmark(sys.argv[1:])
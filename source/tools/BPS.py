@@ -94,9 +94,8 @@ class Bps:
         self.offset += 1
 
     def write_bytes(self, m_bytes):
-        for byte in m_bytes:
-            self.binary_ba[self.offset] = byte
-            self.offset += 1
+        self.binary_ba[self.offset:self.offset + len(m_bytes)] = m_bytes
+        self.offset += len(m_bytes)
 
     def write_u32(self, data):
         self.binary_ba[self.offset] = data & 0x000000ff
@@ -123,12 +122,12 @@ class BpsMode(FastEnum):
     BPS_ACTION_TARGET_COPY = 3
 
 
-def create_bps_from_data(original, modified):
+def create_bps_from_data(original, modified, encoder=None):
     patch = Bps()
     patch.source_size = len(original)
     patch.target_size = len(modified)
 
-    patch.actions = create_bps_linear(original, modified)
+    patch.actions = (encoder or create_bps_indexed)(original, modified)
 
     patch.source_checksum = crc32(original)
     patch.target_checksum = crc32(modified)
@@ -309,6 +308,107 @@ def create_bps_linear(original, modified):
     return patch_actions
 
 
+def bps_match_length(a, i, b, j):
+    # length of the common prefix of a[i:] and b[j:], compared a slice at a time
+    limit = min(len(a) - i, len(b) - j)
+    length, step = 0, 16
+    while length < limit:
+        n = min(step, limit - length)
+        if a[i + length:i + length + n] == b[j + length:j + length + n]:
+            length += n
+            step <<= 1
+        elif n == 1:
+            break
+        else:
+            step = n >> 1
+    return length
+
+
+def create_bps_indexed(original, modified, block=8):
+    # Copies are found through an index of the block aligned pieces of the source and of the target written so far.
+    # Any match of at least 2 blocks contains an aligned piece, it is found there and grown back over the target read
+    # bytes in front of it. Matches are measured with slice comparisons, so the Python work is per action rather than
+    # per byte, except where nothing matches.
+    patch_actions = []
+    source_data = bytes(original)
+    target_data = bytes(modified)
+    source_size = len(source_data)
+    target_size = len(target_data)
+
+    source_index = {}
+    for offset in range(0, source_size - block + 1, block):
+        source_index.setdefault(source_data[offset:offset + block], offset)
+    target_index = {}
+    target_indexed = 0
+
+    source_relative_offset = 0
+    target_relative_offset = 0
+    output_offset = 0
+    read_start = 0  # target bytes from here up to output_offset have no match yet
+
+    while output_offset < target_size:
+        # target copies may only start at bytes that are already written
+        while target_indexed < output_offset and target_indexed + block <= target_size:
+            target_index[target_data[target_indexed:target_indexed + block]] = target_indexed
+            target_indexed += block
+
+        max_length, max_offset, mode = 0, 0, BpsMode.BPS_ACTION_TARGET_READ
+        if (output_offset + 4 <= source_size
+           and source_data[output_offset:output_offset + 4] == target_data[output_offset:output_offset + 4]):
+            max_length = bps_match_length(source_data, output_offset, target_data, output_offset)
+            mode = BpsMode.BPS_ACTION_SOURCE_READ
+        symbol = target_data[output_offset:output_offset + block]
+        node = source_index.get(symbol)
+        if node is not None:
+            length = bps_match_length(source_data, node, target_data, output_offset)
+            if length > max_length:
+                max_length, max_offset, mode = length, node, BpsMode.BPS_ACTION_SOURCE_COPY
+        node = target_index.get(symbol)
+        if node is not None:
+            length = bps_match_length(target_data, node, target_data, output_offset)
+            if length > max_length:
+                max_length, max_offset, mode = length, node, BpsMode.BPS_ACTION_TARGET_COPY
+
+        if mode == BpsMode.BPS_ACTION_TARGET_READ:
+            output_offset += 1
+            continue
+
+        copy_data = source_data if mode == BpsMode.BPS_ACTION_SOURCE_COPY else target_data
+        if mode != BpsMode.BPS_ACTION_SOURCE_READ:
+            while (output_offset > read_start and max_offset > 0
+                   and copy_data[max_offset - 1] == target_data[output_offset - 1]):
+                max_offset -= 1
+                output_offset -= 1
+                max_length += 1
+
+        if output_offset > read_start:
+            patch_actions.append((BpsMode.BPS_ACTION_TARGET_READ, output_offset - read_start,
+                                  target_data[read_start:output_offset]))
+        if mode == BpsMode.BPS_ACTION_SOURCE_READ:
+            patch_actions.append((mode, max_length, None))
+        elif mode == BpsMode.BPS_ACTION_SOURCE_COPY:
+            patch_actions.append((mode, max_length, max_offset - source_relative_offset))
+            source_relative_offset = max_offset + max_length
+        else:
+            patch_actions.append((mode, max_length, max_offset - target_relative_offset))
+            target_relative_offset = max_offset + max_length
+        output_offset += max_length
+        read_start = output_offset
+
+    if output_offset > read_start:
+        patch_actions.append((BpsMode.BPS_ACTION_TARGET_READ, output_offset - read_start,
+                              target_data[read_start:output_offset]))
+
+    return patch_actions
+
+
+# selectable with --bps_encoder, linear is what create_bps_from_data used before the indexed encoder
+bps_encoders = {
+    'indexed': create_bps_indexed,
+    'linear': create_bps_linear,
+}
+
+
 if __name__ == '__main__':
     with open(sys.argv[1], 'rb') as source:
         sourcedata = source.read()
@@ -0,0 +1,128 @@
+import json
+import time
+from collections import Counter, OrderedDict
+
+from BaseClasses import CollectionState
+
+# Per-stage timing and hot path counters for a single generation (--profile).
+# Counters are gathered by wrapping CollectionState methods while a profiled run is active,
+# so nothing is added to those methods when profiling is off.
+
+_originals = {}
+
+
+class CountingQueue(object):
+    # counts pops from the caller's queue while traverse_world works on it in place
+
+    def __init__(self, queue, counters):
+        self.queue = queue
+        self.counters = counters
+
+    def popleft(self):
+        self.counters['traverse_world_pops'] += 1
+        return self.queue.popleft()
+
+    def append(self, item):
+        self.queue.append(item)
+
+    def __len__(self):
+        return len(self.queue)
+
+    def __contains__(self, item):
+        return item in self.queue
+
+    def __iter__(self):
+        return iter(self.queue)
+
+
+class Profiler(object):
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.stages = OrderedDict()
+        self.counters = Counter()
+        self.current = None
+        self.wall_start, self.cpu_start = None, None
+        # a previous profiled run that raised never got to restore the originals
+        uninstall_counters()
+        if enabled:
+            install_counters(self.counters)
+            self.total_wall, self.total_cpu = time.perf_counter(), time.process_time()
+
+    def stage(self, name):
+        # ends the running stage and starts the named one, time spent in a repeated stage is summed
+        if not self.enabled:
+            return
+        wall, cpu = time.perf_counter(), time.process_time()
+        if self.current is not None:
+            entry = self.stages.setdefault(self.current, {'wall': 0.0, 'cpu': 0.0, 'runs': 0})
+            entry['wall'] += wall - self.wall_start
+            entry['cpu'] += cpu - self.cpu_start
+            entry['runs'] += 1
+        self.current = name
+        self.wall_start, self.cpu_start = wall, cpu
+
+    def finish(self):
+        if not self.enabled:
+            return
+        self.stage(None)
+        self.total_wall = time.perf_counter() - self.total_wall
+        self.total_cpu = time.process_time() - self.total_cpu
+        uninstall_counters()
+        self.enabled = False
+
+    def parse_data(self):
+        return {
+            'stages': {name: {'wall': round(entry['wall'], 4), 'cpu': round(entry['cpu'], 4), 'runs': entry['runs']}
+                       for name, entry in self.stages.items()},
+            'total': {'wall': round(self.total_wall, 4), 'cpu': round(self.total_cpu, 4)},
+            'counters': dict(sorted(self.counters.items())),
+        }
+
+    def to_json(self):
+        return json.dumps(self.parse_data())
+
+    def to_file(self, filename):
+        with open(filename, 'w') as outfile:
+            json.dump(self.parse_data(), outfile, indent=2)
+
+
+def install_counters(counters):
+    update_reachable_regions = CollectionState.update_reachable_regions
+    traverse_world = CollectionState.traverse_world
+    copy = CollectionState.copy
+    apply_dungeon_exploration = CollectionState.apply_dungeon_exploration
+
+    def counted_update_reachable_regions(self, player):
+        counters['update_reachable_regions'] += 1
+        return update_reachable_regions(self, player)
+
+    def counted_traverse_world(self, queue, rrp, bc, player):
+        counters['traverse_world'] += 1
+        return traverse_world(self, CountingQueue(queue, counters), rrp, bc, player)
+
+    def counted_copy(self):
+        counters['state_copies'] += 1
+        return copy(self)
+
+    def counted_apply_dungeon_exploration(self, rrp, player, dungeon_name, checklist):
+        hit = apply_dungeon_exploration(self, rrp, player, dungeon_name, checklist)
+        counters['exp_cache_hits' if hit else 'exp_cache_misses'] += 1
+        return hit
+
+    _originals.update({
+        'update_reachable_regions': update_reachable_regions,
+        'traverse_world': traverse_world,
+        'copy': copy,
+        'apply_dungeon_exploration': apply_dungeon_exploration,
+    })
+    CollectionState.update_reachable_regions = counted_update_reachable_regions
+    CollectionState.traverse_world = counted_traverse_world
+    CollectionState.copy = counted_copy
+    CollectionState.apply_dungeon_exploration = counted_apply_dungeon_exploration
+
+
+def uninstall_counters():
+    for name, method in _originals.items():
+        setattr(CollectionState, name, method)
+    _originals.clear()
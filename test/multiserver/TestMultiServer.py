@@ -0,0 +1,233 @@
+import asyncio
+import json
+import os
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+import Items
+import MultiServer
+from MultiClient import ReceivedItem, get_item_name_from_id
+
+
+class StalledSocket(object):
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class TestSendQueues(unittest.TestCase):
+    def setUp(self):
+        self.ctx = MultiServer.Context(None, 0, None)
+
+    def send(self, client, count):
+        async def send_all():
+            for i in range(count):
+                # a full queue must not hold up the sender
+                await asyncio.wait_for(MultiServer.send_msgs(self.ctx, client, [['Print', str(i)]]), 1)
+            await asyncio.sleep(0)
+        asyncio.run(send_all())
+
+    def test_messages_are_queued_in_order(self):
+        client = MultiServer.Client(StalledSocket())
+        self.send(client, 3)
+        self.assertEqual([[['Print', str(i)]] for i in range(3)],
+                         [json.loads(client.send_queue.get_nowait()) for _ in range(3)])
+        self.assertEqual(3, self.ctx.send_queue_peak)
+
+    def test_full_queue_drops_client(self):
+        client = MultiServer.Client(StalledSocket())
+        client.send_queue = asyncio.Queue(2)
+        self.send(client, 3)
+        self.assertIsNone(client.send_queue)
+        self.assertTrue(client.socket.closed)
+        self.assertEqual(1, self.ctx.dropped_clients)
+
+
+class ScriptedSocket(object):
+    # plays the given client messages to the server and keeps what it sends back
+    def __init__(self, incoming):
+        self.incoming = incoming
+        self.sent = []
+
+    def __aiter__(self):
+        return self.receive()
+
+    async def receive(self):
+        for msgs in self.incoming:
+            yield json.dumps(msgs)
+            await asyncio.sleep(0.01)
+
+    async def send(self, data):
+        self.sent.extend(json.loads(data))
+
+    async def close(self):
+        pass
+
+
+class TestClientCommands(unittest.TestCase):
+    def setUp(self):
+        self.ctx = MultiServer.Context(None, 0, None)
+        self.ctx.disable_save = True
+        self.ctx.rom_names[(1, 2, 3)] = (0, 1)
+        self.ctx.player_names[(0, 1)] = 'Player 1'
+        MultiServer.store_received_item(self.ctx, 0, 1, ReceivedItem(0x12, 0x1234, 2))
+
+    def replies(self, incoming):
+        socket = ScriptedSocket(incoming)
+        asyncio.run(MultiServer.server(socket, None, self.ctx))
+        return socket.sent
+
+    def test_command_without_arguments(self):
+        replies = self.replies([[['Connect', {'password': None, 'rom': [1, 2, 3]}]], [['Sync']]])
+        self.assertEqual(['RoomInfo', 'Connected', 'ReceivedItems', 'Print', 'ReceivedItems'],
+                         [cmd for cmd, *args in replies])
+        self.assertEqual([0, [[0x12, 0x1234, 2]]], replies[-1][1])
+
+    def test_invalid_command(self):
+        replies = self.replies([[[1]]])
+        self.assertEqual([['RoomInfo', {'password': False, 'players': []}], ['InvalidCmd']], replies)
+
+
+class TestReceivedItemIndex(unittest.TestCase):
+    players = 4
+
+    def setUp(self):
+        rng = random.Random(22)
+        self.rng = rng
+        self.ctx = MultiServer.Context(None, 0, None)
+        self.ctx.disable_save = True
+        for slot in range(1, self.players + 1):
+            self.ctx.player_names[(0, slot)] = f'Player {slot}'
+            for location in range(1, 200):
+                self.ctx.lookup_id_to_name[location] = f'Location {location}'
+                target_player = rng.choice([p for p in range(1, self.players + 1) if p != slot])
+                self.ctx.locations[(location, slot)] = (rng.randrange(0x100), target_player)
+
+    def linear_scan_checks(self, received, slot, locations):
+        # register_location_checks before the index, every check scanned the target player's received items
+        for location in locations:
+            if (location, slot) in self.ctx.locations:
+                target_item, target_player = self.ctx.locations[(location, slot)]
+                items = received.setdefault(target_player, [])
+                if not any(recvd_location == location and sender == slot for _, recvd_location, sender in items):
+                    items.append((target_item, location, slot))
+
+    def test_checks_match_linear_scan(self):
+        received = {}
+        for _ in range(300):
+            slot = self.rng.randrange(1, self.players + 1)
+            locations = [self.rng.randrange(1, 250) for _ in range(self.rng.randint(1, 5))]
+            MultiServer.register_location_checks(self.ctx, 0, slot, locations)
+            self.linear_scan_checks(received, slot, locations)
+        for player in range(1, self.players + 1):
+            items = MultiServer.get_received_items(self.ctx, 0, player)
+            self.assertEqual(received.get(player, []), MultiServer.tuplize_received_items(items))
+            self.assertEqual(received.get(player, []), MultiServer.get_received_item_tuples(self.ctx, 0, player))
+            for location in range(1, 250):
+                for sender in range(1, self.players + 1):
+                    self.assertEqual(any(item.location == location and item.player == sender for item in items),
+                                     MultiServer.has_received_item(self.ctx, 0, player, location, sender))
+
+    def test_index_of_loaded_items(self):
+        MultiServer.forfeit_player(self.ctx, 0, 1)
+        for slot in range(2, self.players + 1):
+            MultiServer.register_location_checks(self.ctx, 0, slot, range(1, 100))
+        tuples, keys = self.ctx.received_item_tuples, self.ctx.received_item_keys
+        self.assertEqual(199 + 3 * 99, sum(len(items) for items in tuples.values()))
+        MultiServer.index_received_items(self.ctx)
+        self.assertEqual(tuples, self.ctx.received_item_tuples)
+        self.assertEqual(keys, self.ctx.received_item_keys)
+
+    def test_item_names_match_table_scan(self):
+        for code in list(range(0x100)) + [0x1234]:
+            names = [k for k, i in Items.item_table.items() if type(i[3]) is int and i[3] == code]
+            self.assertEqual(names[0] if names else f'Unknown item (ID:{code})', get_item_name_from_id(code))
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.save_filename = os.path.join(self.tempdir.name, 'test_multisave')
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def context(self):
+        ctx = MultiServer.Context(None, 0, None)
+        ctx.save_filename = self.save_filename
+        ctx.rom_names[(1, 2, 3)] = (0, 1)
+        ctx.rom_names[(4, 5, 6)] = (0, 2)
+        return ctx
+
+    def received(self, ctx):
+        return {k: MultiServer.tuplize_received_items(v) for k, v in ctx.received_items.items() if v}
+
+    def play(self, ctx, count, compact_records):
+        # finds items as the clients would, letting the writer catch up every few checks
+        async def find_items():
+            for i in range(count):
+                MultiServer.add_received_item(ctx, 0, 1 + i % 2, ReceivedItem(i % 0x100, 0x1000 + i, 2 - i % 2))
+                MultiServer.save_received_items(ctx)
+                if i % 7 == 0:
+                    await ctx.journal_task
+            await ctx.journal_task
+        with mock.patch('MultiServer.journal_compact_records', compact_records):
+            asyncio.run(find_items())
+
+    def test_replay_restores_received_items(self):
+        ctx = self.context()
+        MultiServer.load_save_file(ctx)
+        self.play(ctx, 100, 30)
+        loaded = self.context()
+        MultiServer.load_save_file(loaded)
+        self.assertEqual(self.received(ctx), self.received(loaded))
+        self.assertEqual(MultiServer.tuplize_received_items(ctx.received_items[(0, 1)]),
+                         loaded.received_item_tuples[(0, 1)])
+
+    def test_clean_start_rewrites_nothing(self):
+        ctx = self.context()
+        MultiServer.load_save_file(ctx)
+        self.play(ctx, 10, 5)
+        # the first start folds the records the journal holds into the save file
+        MultiServer.load_save_file(self.context())
+        loaded = self.context()
+        with mock.patch('MultiServer.write_save_file') as write_save_file, \
+                mock.patch('MultiServer.start_journal') as start_journal:
+            MultiServer.load_save_file(loaded)
+        write_save_file.assert_not_called()
+        start_journal.assert_not_called()
+        self.assertEqual(self.received(ctx), self.received(loaded))
+
+    def test_cut_off_record_still_loads(self):
+        ctx = self.context()
+        MultiServer.load_save_file(ctx)
+        self.play(ctx, 10, 1000)
+        with open(ctx.journal_filename, 'a') as f:
+            f.write(json.dumps([0, 1, 5, 0x20, 0x2000, 2])[:-5])
+        loaded = self.context()
+        MultiServer.load_save_file(loaded)
+        self.assertEqual(self.received(ctx), self.received(loaded))
+        # the replay was folded into the save file, so the journal is started again
+        with open(ctx.journal_filename) as f:
+            self.assertEqual(1, len(f.read().splitlines()))
+
+    def test_cut_off_only_record_restarts_journal(self):
+        ctx = self.context()
+        MultiServer.load_save_file(ctx)
+        with open(ctx.journal_filename, 'a') as f:
+            f.write(json.dumps([0, 1, 0, 0x20, 0x2000, 2])[:-1])
+        loaded = self.context()
+        MultiServer.load_save_file(loaded)
+        self.assertEqual({}, self.received(loaded))
+        self.play(loaded, 3, 1000)
+        reloaded = self.context()
+        MultiServer.load_save_file(reloaded)
+        self.assertEqual(self.received(loaded), self.received(reloaded))
+
+
+if __name__ == '__main__':
+    unittest.main()
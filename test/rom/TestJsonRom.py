@@ -0,0 +1,85 @@
+import bisect
+import json
+import random
+import unittest
+
+from Rom import JsonRom
+
+
+class DictJsonRom(object):
+    # JsonRom before the byte overlay, patches merged in place and located through a sorted list of start addresses
+    def __init__(self):
+        self.patches = {}
+        self.addresses = []
+
+    def write_bytes(self, startaddress, values):
+        if not values:
+            return
+        values = list(values)
+
+        pos = bisect.bisect_right(self.addresses, startaddress)
+        intervalstart = self.addresses[pos-1] if pos else None
+        intervalpatch = self.patches[str(intervalstart)] if pos else None
+
+        if pos and startaddress <= intervalstart + len(intervalpatch):
+            offset = startaddress - intervalstart
+            intervalpatch[offset:offset+len(values)] = values
+            startaddress = intervalstart
+            values = intervalpatch
+        else:
+            self.addresses.insert(pos, startaddress)
+            self.patches[str(startaddress)] = values
+            pos = pos + 1
+
+        while pos < len(self.addresses) and self.addresses[pos] <= startaddress + len(values):
+            intervalstart = self.addresses[pos]
+            values.extend(self.patches[str(intervalstart)][startaddress+len(values)-intervalstart:])
+            del self.patches[str(intervalstart)]
+            del self.addresses[pos]
+
+
+def random_writes(rng, count, size):
+    return [(rng.randrange(size), [rng.randrange(256) for _ in range(rng.randint(0, 12))]) for _ in range(count)]
+
+
+class TestJsonRom(unittest.TestCase):
+    def assertSamePatches(self, writes):
+        old, new = DictJsonRom(), JsonRom()
+        for address, values in writes:
+            old.write_bytes(address, values)
+            new.write_bytes(address, values)
+        # the key order ends up in the json, so the dumps are compared rather than the dicts
+        self.assertEqual(json.dumps([old.patches]), json.dumps([new.patches]))
+
+    def test_matches_dict_patches(self):
+        rng = random.Random(20)
+        for size in (64, 512, 0x4000):
+            for _ in range(50):
+                with self.subTest(size=size):
+                    self.assertSamePatches(random_writes(rng, 60, size))
+
+    def test_touching_and_overlapping_writes(self):
+        self.assertSamePatches([(10, [1]), (11, [2]), (9, [3])])
+        self.assertSamePatches([(20, [1, 2]), (10, [3]), (5, [4] * 16), (30, [5])])
+        self.assertSamePatches([(10, [1, 2, 3]), (11, [7]), (0, [0, 0]), (2, [6] * 8)])
+        self.assertSamePatches([(5, [0]), (3, [0]), (4, [0]), (0, [])])
+
+    def test_patches_follow_writes(self):
+        rom = JsonRom()
+        rom.write_bytes(4, [1, 2])
+        self.assertEqual({'4': [1, 2]}, rom.patches)
+        rom.write_byte(6, 3)
+        self.assertEqual({'4': [1, 2, 3]}, rom.patches)
+
+    def test_copy_is_independent(self):
+        rom = JsonRom()
+        rom.write_bytes(4, [1, 2])
+        copied = rom.copy()
+        copied.write_bytes(5, [9, 9])
+        rom.write_bytes(100, [7])
+        self.assertEqual({'4': [1, 2], '100': [7]}, rom.patches)
+        self.assertEqual({'4': [1, 9, 9]}, copied.patches)
+
+
+if __name__ == '__main__':
+    unittest.main()
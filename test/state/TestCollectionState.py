@@ -0,0 +1,142 @@
+import unittest
+from types import SimpleNamespace
+
+from BaseClasses import CollectionState, PlayerStateMap, ProgItems
+from Items import ItemFactory
+
+
+class TestPlayerStateMap(unittest.TestCase):
+    def setUp(self):
+        self.parent = PlayerStateMap({1: {'a'}, 2: {'b'}}, set.copy)
+        self.child = self.parent.copy()
+
+    def assertUntouched(self, state_map):
+        self.assertEqual({1: {'a'}, 2: {'b'}}, dict(state_map))
+
+    def test_getitem(self):
+        self.child[1].add('x')
+        self.assertUntouched(self.parent)
+
+    def test_get(self):
+        self.child.get(1).add('x')
+        self.assertUntouched(self.parent)
+
+    def test_items(self):
+        for player, value in self.child.items():
+            value.add('x')
+        self.assertUntouched(self.parent)
+
+    def test_values(self):
+        for value in self.child.values():
+            value.add('x')
+        self.assertUntouched(self.parent)
+
+    def test_setdefault(self):
+        self.child.setdefault(2, set()).add('x')
+        self.assertUntouched(self.parent)
+
+    def test_pop(self):
+        self.child.pop(1).add('x')
+        self.assertUntouched(self.parent)
+
+    def test_replaced_value_is_not_cloned(self):
+        replacement = set()
+        self.child[1] = replacement
+        self.assertIs(replacement, self.child[1])
+        self.assertUntouched(self.parent)
+
+    def test_parent_writes(self):
+        self.parent[1].add('x')
+        self.parent.get(2).add('y')
+        self.assertUntouched(self.child)
+
+
+class TestCollectionStateCopy(unittest.TestCase):
+    def setUp(self):
+        self.state = CollectionState(SimpleNamespace(players=2, precollected_items=[]))
+        self.state.reachable_regions[1]['Menu'] = 'Orange'
+        self.state.opened_doors[1].add('Door')
+        self.state.door_counter[1][1]['Dungeon'] = 1
+        self.state.dungeons_to_check[1]['Dungeon']['Door'] = 'Conn'
+
+    def test_child_writes_leave_parent_unchanged(self):
+        child = self.state.copy()
+        child.reachable_regions.get(1)['Region'] = 'Blue'
+        for player, doors in child.opened_doors.items():
+            doors.add('Other Door')
+        for reached, opened in child.door_counter.values():
+            opened['Dungeon'] += 1
+        child.dungeons_to_check.setdefault(1, None)['Dungeon']['Other Door'] = 'Conn'
+        child.blocked_connections.pop(2)['Connection'] = 'Orange'
+
+        self.assertEqual({'Menu': 'Orange'}, self.state.reachable_regions[1])
+        self.assertEqual({'Door'}, self.state.opened_doors[1])
+        self.assertEqual(set(), self.state.opened_doors[2])
+        self.assertEqual(1, self.state.door_counter[1][1]['Dungeon'])
+        self.assertEqual({'Door': 'Conn'}, self.state.dungeons_to_check[1]['Dungeon'])
+        self.assertEqual({}, self.state.blocked_connections[2])
+
+    def test_parent_writes_leave_child_unchanged(self):
+        child = self.state.copy()
+        self.state.reachable_regions[1]['Region'] = 'Blue'
+        self.state.dungeons_to_check.get(1)['Dungeon']['Other Door'] = 'Conn'
+        self.assertEqual({'Menu': 'Orange'}, child.reachable_regions[1])
+        self.assertEqual({'Door': 'Conn'}, child.dungeons_to_check[1]['Dungeon'])
+
+
+class TestProgItems(unittest.TestCase):
+    def setUp(self):
+        self.prog_items = ProgItems(1)
+
+    def test_counts_like_a_counter(self):
+        self.prog_items['Hammer', 1] += 1
+        self.prog_items['Hammer', 1] += 1
+        self.assertEqual(2, self.prog_items['Hammer', 1])
+        self.assertEqual(0, self.prog_items['Hookshot', 1])
+        self.assertEqual([(('Hammer', 1), 2)], list(self.prog_items.items()))
+        copy = self.prog_items.copy()
+        copy['Hammer', 1] -= 1
+        self.assertEqual(2, self.prog_items['Hammer', 1])
+
+    def test_decrement_below_zero(self):
+        self.prog_items['Hammer', 1] -= 1
+        self.assertEqual(0, self.prog_items['Hammer', 1])
+        self.assertNotIn(('Hammer', 1), self.prog_items)
+
+    def test_delete_missing(self):
+        del self.prog_items['Hammer', 1]
+        self.assertEqual(0, len(self.prog_items))
+
+
+class TestCollectionStateRemove(unittest.TestCase):
+    def setUp(self):
+        self.state = CollectionState(SimpleNamespace(players=1, precollected_items=[]))
+
+    def remove(self, name):
+        item = ItemFactory(name, 1)
+        item.advancement = True
+        self.state.remove(item)
+
+    def test_remove_last_copy(self):
+        self.state.prog_items['Hammer', 1] += 1
+        self.remove('Hammer')
+        self.assertFalse(self.state.has('Hammer', 1))
+
+    def test_remove_uncollected(self):
+        self.remove('Hammer')
+        self.assertFalse(self.state.has('Hammer', 1))
+
+    def test_remove_progressive_shield_without_shield(self):
+        self.remove('Progressive Shield')
+        self.assertEqual(0, self.state.item_count('None', 1))
+
+    def test_remove_progressive_sword(self):
+        self.state.prog_items['Fighter Sword', 1] += 1
+        self.state.prog_items['Master Sword', 1] += 1
+        self.remove('Progressive Sword')
+        self.assertTrue(self.state.has('Fighter Sword', 1))
+        self.assertFalse(self.state.has('Master Sword', 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import io
+import random
+import unittest
+
+import bps.apply
+import bps.io
+
+from source.tools.BPS import bps_encoders, create_bps_from_data, create_bps_indexed
+
+
+def random_bytes(rng, length):
+    return rng.getrandbits(length * 8).to_bytes(length, 'little') if length else b''
+
+
+def rom_like_pair(rng, size):
+    # a base with zero filled and repeated stretches, patched with scattered edits, moved code and an expansion
+    original = bytearray()
+    while len(original) < size:
+        length = rng.randint(0x10, 0x400)
+        kind = rng.random()
+        if kind < 0.2:
+            original.extend(bytes(length))
+        elif kind < 0.4 and len(original) > length:
+            start = rng.randrange(0, len(original) - length)
+            original.extend(original[start:start + length])
+        else:
+            original.extend(random_bytes(rng, length))
+    del original[size:]
+    modified = bytearray(original) + bytearray(size)
+    for _ in range(200):
+        start = rng.randrange(0, size - 0x20)
+        modified[start:start + rng.randint(1, 0x20)] = random_bytes(rng, rng.randint(1, 0x20))
+    for offset in range(size, size * 2 - 0x400, 0x400):
+        start = rng.randrange(0, size - 0x400)
+        modified[offset:offset + 0x400] = original[start:start + 0x400] if rng.random() < 0.5 else random_bytes(rng, 0x400)
+    return bytes(original), bytes(modified)
+
+
+def apply_patch(patch, original, target_size):
+    result = bytearray(target_size)
+    bps.apply.apply_to_bytearrays(bps.io.read_bps(io.BytesIO(patch.binary_ba)), original, result)
+    return result
+
+
+class TestBPS(unittest.TestCase):
+    def assertRoundTrip(self, original, modified, encoder):
+        patch = create_bps_from_data(original, modified, encoder)
+        self.assertEqual(bytes(modified), bytes(apply_patch(patch, original, len(modified))),
+                         f'{encoder.__name__} does not recreate the target')
+        return patch
+
+    def test_rom_like_pair(self):
+        original, modified = rom_like_pair(random.Random(17), 0x10000)
+        sizes = {name: len(self.assertRoundTrip(original, modified, encoder).binary_ba)
+                 for name, encoder in bps_encoders.items()}
+        self.assertLess(sizes['indexed'], sizes['linear'])
+
+    def test_edge_cases(self):
+        rng = random.Random(5)
+        data = random_bytes(rng, 0x800)
+        pairs = [
+            (b'', b''),
+            (data, b''),
+            (b'', data),
+            (data, data),
+            (data, data[:0x123]),
+            (data[:0x123], data),
+            (data, data[0x400:] + data[:0x400]),
+            (data, bytes(0x800)),
+            (bytes(0x800), b'\x41' * 0x1000),
+            (data, data[:0x200] + b'\x00' * 3 + data[0x203:]),
+            (b'\x01\x02' * 0x300, b'\x01\x02' * 0x301 + b'\x03'),
+        ]
+        for original, modified in pairs:
+            for encoder in bps_encoders.values():
+                with self.subTest(encoder=encoder.__name__, source=len(original), target=len(modified)):
+                    self.assertRoundTrip(original, modified, encoder)
+
+    def test_indexed_is_the_default(self):
+        original, modified = rom_like_pair(random.Random(3), 0x2000)
+        self.assertEqual(create_bps_from_data(original, modified, create_bps_indexed).binary_ba,
+                         create_bps_from_data(original, modified).binary_ba)
+
+
+if __name__ == '__main__':
+    unittest.main()
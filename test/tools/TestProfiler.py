@@ -0,0 +1,43 @@
+import unittest
+from argparse import Namespace
+from collections import Counter, deque
+from unittest import mock
+
+import Main
+from BaseClasses import CollectionState
+from source.tools.Profiler import CountingQueue, Profiler
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.copy = CollectionState.copy
+
+    def tearDown(self):
+        CollectionState.copy = self.copy
+
+    def test_finish_restores_methods(self):
+        profiler = Profiler(True)
+        self.assertIsNot(self.copy, CollectionState.copy)
+        profiler.finish()
+        self.assertIs(self.copy, CollectionState.copy)
+
+    def test_failed_run_restores_methods(self):
+        with mock.patch('Main.generate', side_effect=RuntimeError('failed')):
+            with self.assertRaises(RuntimeError):
+                Main.main(Namespace(profile=True))
+        self.assertIs(self.copy, CollectionState.copy)
+
+    def test_counting_queue_works_on_the_callers_queue(self):
+        counters = Counter()
+        queue = deque([1, 2])
+        counting_queue = CountingQueue(queue, counters)
+        self.assertEqual(1, counting_queue.popleft())
+        counting_queue.append(3)
+        self.assertIn(3, counting_queue)
+        self.assertEqual(2, len(counting_queue))
+        self.assertEqual(deque([2, 3]), queue)
+        self.assertEqual(1, counters['traverse_world_pops'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import random
+import unittest
+
+from Utils import byte_sum, changed_runs
+
+
+def byte_at_a_time_runs(old, new):
+    # the loop LocalRom.create_json_patch used before changed_runs
+    runs, i = [], 0
+    while i < len(new):
+        if new[i] == old[i]:
+            i += 1
+            continue
+        start = i
+        while i < len(new) and new[i] != old[i]:
+            i += 1
+        runs.append((start, i))
+    return runs
+
+
+def random_bytes(rng, length):
+    return rng.getrandbits(length * 8).to_bytes(length, 'little') if length else b''
+
+
+class TestByteSum(unittest.TestCase):
+    def test_matches_sum(self):
+        rng = random.Random(16)
+        for data in (b'', b'\x00', b'\xff', b'\xff' * 255, b'\xff' * 256, b'\xff' * 257, bytes(1000),
+                     b'\xff' * 0x400000, random_bytes(rng, 0x12345), bytearray(random_bytes(rng, 0x200000))):
+            with self.subTest(length=len(data)):
+                self.assertEqual(sum(data), byte_sum(data))
+
+    def test_rom_checksum(self):
+        # write_crc leaves the four checksum bytes out of the sum
+        buffer = bytearray(random_bytes(random.Random(4), 0x200000))
+        self.assertEqual(sum(buffer[:0x7FDC] + buffer[0x7FE0:]), byte_sum(buffer) - sum(buffer[0x7FDC:0x7FE0]))
+
+
+class TestChangedRuns(unittest.TestCase):
+    def test_matches_byte_at_a_time_loop(self):
+        rng = random.Random(16)
+        old = random_bytes(rng, 0x10000)
+        new = bytearray(old)
+        for _ in range(300):
+            start, length = rng.randrange(len(new) - 40), rng.randint(1, 40)
+            new[start:start + length] = random_bytes(rng, length)
+        new[-3:] = b'\x00\x01\x02'
+        self.assertEqual(byte_at_a_time_runs(old, new), changed_runs(old, new))
+
+    def test_edges(self):
+        old = bytes(range(256)) * 4
+        cases = [
+            old,
+            b'\xff' + old[1:],
+            old[:-1] + b'\x00',
+            bytes(b ^ 0x80 for b in old),
+            old[:10] + b'\x00\x00' + old[12:],
+            b'',
+        ]
+        for new in cases:
+            base = old[:len(new)]
+            with self.subTest(new=new[:16]):
+                self.assertEqual(byte_at_a_time_runs(base, new), changed_runs(base, new))
+
+    def test_zero_bytes_inside_a_run_split_it(self):
+        # a byte that is written with its old value is not part of the patch
+        self.assertEqual([(0, 1), (2, 3)], changed_runs(b'\x01\x02\x03', b'\x05\x02\x07'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+from unittest import mock
+
+import RaceRandom as random
+from Utils import random_permutation
+
+
+def shuffled_list(n):
+    # how the key door combinations were drawn before random_permutation
+    sample_list = list(range(0, n))
+    random.shuffle(sample_list)
+    return sample_list
+
+
+class TestRandomPermutation(unittest.TestCase):
+    def test_matches_shuffled_list_up_to_limit(self):
+        # seed 7 retro crossed standard has a dungeon with this many combinations
+        for n in (1, 2, 75582):
+            random.seed(7)
+            expected = shuffled_list(n)
+            after = random.random()
+            random.seed(7)
+            samples = random_permutation(n)
+            self.assertEqual(next(samples), expected[0])
+            self.assertEqual(after, random.random(), f'different random numbers drawn for {n}')
+            random.seed(7)
+            self.assertEqual(expected, list(random_permutation(n)))
+
+    @mock.patch('Utils.shuffled_list_limit', 1000)
+    def test_lazy_walk_is_a_permutation(self):
+        n = 12345
+        random.seed(7)
+        drawn = list(random_permutation(n))
+        self.assertEqual(n, len(drawn))
+        self.assertEqual(set(range(n)), set(drawn))
+
+
+if __name__ == '__main__':
+    unittest.main()